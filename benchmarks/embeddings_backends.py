@@ -0,0 +1,132 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+
+from rag_3w_cot.embeddings import EmbeddingsFactory
+from rag_3w_cot.embeddings.onnx import ONNX_QUANTIZATIONS
+from rag_3w_cot.settings import Settings
+
+load_dotenv()
+
+
+def load_texts(texts_path: Optional[Path], num_texts: int, seed: int) -> List[str]:
+    if texts_path:
+        texts = json.loads(texts_path.read_text())
+        return [text if isinstance(text, str) else text["text"] for text in texts][
+            :num_texts
+        ]
+
+    # mix of short table rows and long paragraphs, as in the processed reports
+    generator = np.random.default_rng(seed)
+    words = ["revenue", "net", "income", "total", "assets", "2022", "million", "USD"]
+    words += ["the", "company", "reported", "an", "increase", "of", "in", "fiscal"]
+    lengths = generator.choice([8, 16, 64, 256], size=num_texts)
+    return [" ".join(generator.choice(words, size=length)) for length in lengths]
+
+
+def embed(settings: Settings, texts: List[str]) -> tuple:
+    start = time.perf_counter()
+    embeddings = EmbeddingsFactory.create_model(settings)
+    load_seconds = time.perf_counter() - start
+
+    # warm up, so the first batch does not count session/graph initialization
+    embeddings.embed_documents(texts[: settings.embeddings_huggingface_batch_size])
+
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    return vectors, load_seconds, embed_seconds
+
+
+def benchmark(
+    texts: List[str],
+    embeddings_model: str,
+    quantizations: List[str],
+    batch_size: int,
+    threads: Optional[int],
+    tolerance: float = 1e-3,
+) -> List[dict]:
+    base_settings = {
+        "device": "cpu",
+        "embeddings_model": embeddings_model,
+        "embeddings_huggingface_batch_size": batch_size,
+        "embeddings_huggingface_onnx_threads": threads,
+    }
+
+    results = []
+    reference = None
+    backends = [("torch", "none")] + [("onnx", q) for q in quantizations]
+    for backend, quantization in backends:
+        settings = Settings(
+            **base_settings,  # pyright: ignore
+            embeddings_huggingface_backend=backend,
+            embeddings_huggingface_onnx_quantization=quantization,
+        )
+        vectors, load_seconds, embed_seconds = embed(settings, texts)
+        if reference is None:
+            reference = vectors
+
+        # vectors are normalized, so the dot product is the cosine similarity
+        cosine_similarities = np.sum(vectors * reference, axis=1)
+        results.append(
+            {
+                "backend": backend,
+                "quantization": quantization,
+                "chunks_per_second": round(len(texts) / embed_seconds, 2),
+                "load_seconds": round(load_seconds, 2),
+                "max_abs_diff": float(np.abs(vectors - reference).max()),
+                "min_cosine_similarity": float(cosine_similarities.min()),
+                "mean_cosine_similarity": float(cosine_similarities.mean()),
+            }
+        )
+        logger.info(json.dumps(results[-1]))
+
+        # int8 weights drift by design, only the float32 export must match torch
+        if quantization == "none" and results[-1]["max_abs_diff"] > tolerance:
+            logger.warning(f"{backend} vectors differ from torch above {tolerance}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput & tolerance of the ONNX embeddings backend vs torch"
+    )
+    parser.add_argument("--texts-path", type=Path, default=None)
+    parser.add_argument("--num-texts", type=int, default=1_000)
+    parser.add_argument("--embeddings-model", default="BAAI/bge-large-en")
+    parser.add_argument(
+        "--quantizations",
+        nargs="+",
+        choices=ONNX_QUANTIZATIONS,
+        default=["none", "avx512_vnni"],
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = benchmark(
+        load_texts(args.texts_path, args.num_texts, args.seed),
+        embeddings_model=args.embeddings_model,
+        quantizations=args.quantizations,
+        batch_size=args.batch_size,
+        threads=args.threads,
+        tolerance=args.tolerance,
+    )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from rag_3w_cot.vectorstores.indexes import (
+    RerankIndex,
+    create_index,
+    is_quantized,
+    set_search_parameters,
+    train_index,
+)
+
+
+def load_vectors(
+    index_path: Optional[Path], num_vectors: int, dimension: int, seed: int
+) -> np.ndarray:
+    if index_path:
+        index = faiss.read_index(str(index_path / "index.faiss"))
+        return index.reconstruct_n(0, index.ntotal)
+
+    # clustered synthetic vectors, closer to real embeddings than uniform noise
+    generator = np.random.default_rng(seed)
+    centroids = generator.normal(size=(max(1, num_vectors // 100), dimension))
+    assignments = generator.integers(0, len(centroids), size=num_vectors)
+    vectors = centroids[assignments] + 0.5 * generator.normal(
+        size=(num_vectors, dimension)
+    )
+    vectors = vectors.astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def get_recall_at_k(ground_truth: np.ndarray, rows: np.ndarray) -> float:
+    hits = [
+        len(np.intersect1d(truth, found[found >= 0]))
+        for truth, found in zip(ground_truth, rows)
+    ]
+    return float(np.sum(hits) / ground_truth.size)
+
+
+def benchmark(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    index_types: List[str],
+    nprobes: List[int],
+    ef_searches: List[int],
+    train_sample_size: int,
+    nlist: int,
+    pq_m: int,
+    quantization: str = "none",
+    rerank_k_factor: int = 0,
+) -> List[dict]:
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, ground_truth = flat.search(queries, k)
+
+    results = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = create_index(
+            vectors.shape[1],
+            index_type,
+            num_train=min(len(vectors), train_sample_size),
+            nlist=nlist,
+            pq_m=pq_m,
+            quantization=quantization,
+        )
+        train_index(index, vectors, train_sample_size)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1024**2
+
+        reranked = is_quantized(index_type, quantization) and rerank_k_factor > 0
+        if reranked:
+            index = RerankIndex(
+                base_index=index, vectors=vectors, k_factor=rerank_k_factor
+            )
+
+        operating_points = [(0, 0)]
+        if index_type.startswith("ivf"):
+            operating_points = [(nprobe, 0) for nprobe in nprobes]
+        elif index_type == "hnsw":
+            operating_points = [(0, ef_search) for ef_search in ef_searches]
+
+        for nprobe, ef_search in operating_points:
+            set_search_parameters(index, nprobe, ef_search)
+
+            start = time.perf_counter()
+            _, rows = index.search(queries, k)
+            latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            results.append(
+                {
+                    "index_type": index_type,
+                    "quantization": quantization,
+                    "rerank_k_factor": rerank_k_factor if reranked else None,
+                    "nprobe": nprobe or None,
+                    "ef_search": ef_search or None,
+                    f"recall@{k}": round(get_recall_at_k(ground_truth, rows), 4),
+                    "latency_ms_per_query": round(latency_ms, 4),
+                    "build_seconds": round(build_seconds, 2),
+                    "size_mb": round(size_mb, 2),
+                }
+            )
+            logger.info(json.dumps(results[-1]))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall@k & latency of FAISS index types against a flat index"
+    )
+    parser.add_argument("--index-path", type=Path, default=None)
+    parser.add_argument("--num-vectors", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--num-queries", type=int, default=1_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--index-types", nargs="+", default=["flat", "ivf_flat", "ivf_pq", "hnsw"]
+    )
+    parser.add_argument("--nprobes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-searches", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--train-sample-size", type=int, default=100_000)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument(
+        "--quantization", choices=["none", "sq8", "pq"], default="none"
+    )
+    parser.add_argument("--rerank-k-factor", type=int, default=0)
+    parser.add_argument("--omp-threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if args.omp_threads:
+        faiss.omp_set_num_threads(args.omp_threads)
+
+    vectors = load_vectors(args.index_path, args.num_vectors, args.dimension, args.seed)
+    generator = np.random.default_rng(args.seed + 1)
+    queries = vectors[generator.choice(len(vectors), args.num_queries)]
+    queries = queries + 0.05 * generator.normal(size=queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    results = benchmark(
+        vectors,
+        queries,
+        k=args.k,
+        index_types=args.index_types,
+        nprobes=args.nprobes,
+        ef_searches=args.ef_searches,
+        train_sample_size=args.train_sample_size,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        quantization=args.quantization,
+        rerank_k_factor=args.rerank_k_factor,
+    )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
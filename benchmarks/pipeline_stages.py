@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from dotenv import load_dotenv
+from loguru import logger
+from synthetic_corpus import generate_corpus
+
+from rag_3w_cot.llms import BaseLLM
+from rag_3w_cot.models import Query
+from rag_3w_cot.pipelines import CotPipeline
+from rag_3w_cot.processors import DocumentProcessor, QueryProcessor
+from rag_3w_cot.settings import Settings
+
+load_dotenv()
+
+
+class StubLLM(BaseLLM):
+    model: str = "benchmark/stub"
+
+    def call(self, inputs: List[List[dict]], **_) -> List[List[dict]]:
+        return [[{"generated_text": self.generate(messages)}] for messages in inputs]
+
+    @staticmethod
+    def generate(messages: List[dict]) -> str:
+        # answers step 1 with the retrieved documents, later steps echo the answer
+        content = messages[-1]["content"]
+        try:
+            query = json.loads(content)
+        except json.JSONDecodeError:
+            return content
+
+        if not isinstance(query, dict) or "value" in query:
+            return content
+
+        documents = [json.loads(message["content"]) for message in messages[1:-1]]
+        answer = {
+            **query,
+            "value": len(documents),
+            "references": [
+                {
+                    "pdf_sha1": document["metadata"]["pdf_sha1"],
+                    "page_index": document["metadata"]["page_index"],
+                }
+                for document in documents[:1]
+            ],
+        }
+        return json.dumps(answer)
+
+
+class StubCotPipeline(CotPipeline):
+    @cached_property
+    def llm(self) -> BaseLLM:
+        return StubLLM(settings=self.settings)
+
+
+def measure(func: Callable[[], Any], repeats: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "repeats": repeats,
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "mean_seconds": statistics.mean(timings),
+    }
+
+
+def load_queries(data_path: Path) -> List[Query]:
+    return [
+        Query(question_text=question["text"], kind=question["kind"])
+        for question in json.loads((data_path / "questions.json").read_text())
+    ]
+
+
+def benchmark(
+    settings: Settings, data_path: Path, repeats: int, search_repeats: int
+) -> List[dict]:
+    document_processor = DocumentProcessor(
+        settings=settings, data_path=data_path, metadata_file=data_path / "subset.json"
+    )
+    query_processor = QueryProcessor(
+        settings=settings, data_path=data_path, metadata_file=data_path / "subset.json"
+    )
+    files = document_processor.available_files
+    elements_per_file = [
+        json.loads((data_path / "elements" / f"{file.stem}.json").read_text())
+        for file in files
+    ]
+
+    results = []
+
+    def record(stage: str, num_items: int, timings: dict):
+        results.append(
+            {
+                "stage": stage,
+                "items": num_items,
+                "items_per_second": round(num_items / timings["median_seconds"], 2),
+                **timings,
+            }
+        )
+        logger.info(json.dumps(results[-1]))
+
+    # chunk cache: unstructured elements to documents, written & read back
+    async def write_cache():
+        years = await document_processor._extract_years(elements_per_file)
+        for file, elements, year in zip(files, elements_per_file, years):
+            documents = await document_processor._json_to_documents(elements, year)
+            await document_processor._cache_documents(documents, file)
+
+    async def load_cache():
+        cached_elements = await asyncio.gather(
+            *[document_processor._load_cached_elements(file) for file in files]
+        )
+        years = await document_processor._extract_years(cached_elements)
+        return await asyncio.gather(
+            *[
+                document_processor._json_to_documents(elements, year)
+                for elements, year in zip(cached_elements, years)
+            ]
+        )
+
+    num_elements = sum(len(elements) for elements in elements_per_file)
+    record("cache_write", num_elements, measure(lambda: asyncio.run(write_cache()), 1))
+    record(
+        "cache_load", num_elements, measure(lambda: asyncio.run(load_cache()), repeats)
+    )
+
+    # dedup & filtering, per file as in the document processor
+    documents_per_file = asyncio.run(load_cache())
+    documents_per_file = [
+        asyncio.run(document_processor._html_to_markdown(documents))[0]
+        for documents in documents_per_file
+    ]
+    num_documents = sum(len(documents) for documents in documents_per_file)
+
+    def run_per_file(func: Callable) -> Callable[[], List]:
+        return lambda: [func(documents) for documents in documents_per_file]
+
+    record(
+        "deduplicate",
+        num_documents,
+        measure(
+            run_per_file(
+                lambda documents: asyncio.run(
+                    document_processor._deduplicate_documents(documents)
+                )
+            ),
+            repeats,
+        ),
+    )
+    record(
+        "filter_small",
+        num_documents,
+        measure(run_per_file(document_processor._filter_small_documents), repeats),
+    )
+    for method in ["tfidf", "minhash"]:
+        processor = DocumentProcessor(
+            settings=settings.model_copy(
+                update={"processing_document_filter_similar_documents_method": method}
+            ),
+            data_path=data_path,
+            metadata_file=data_path / "subset.json",
+        )
+        record(
+            f"filter_similar_{method}",
+            num_documents,
+            measure(
+                run_per_file(
+                    lambda documents: asyncio.run(
+                        processor._filter_similar_documents(documents)
+                    )
+                ),
+                repeats,
+            ),
+        )
+
+    # index once with the processed documents, searches reuse it
+    documents = []
+    for file_documents in documents_per_file:
+        file_documents = asyncio.run(
+            document_processor._deduplicate_documents(file_documents)
+        )
+        file_documents = document_processor._filter_small_documents(file_documents)
+        documents.extend(
+            asyncio.run(document_processor._filter_similar_documents(file_documents))
+        )
+    record(
+        "index_build",
+        len(documents),
+        measure(lambda: document_processor.vectorstore.create(documents), 1, warmup=0),
+    )
+
+    queries = load_queries(data_path)
+
+    async def route_queries():
+        return await asyncio.gather(
+            *[query_processor._get_relevant_files(query) for query in queries]
+        )
+
+    relevant_files = asyncio.run(route_queries())
+    record(
+        "owner_routing",
+        len(queries),
+        measure(lambda: asyncio.run(route_queries()), repeats),
+    )
+    record(
+        "search",
+        len(queries),
+        measure(
+            lambda: asyncio.run(
+                query_processor._get_relevant_documents(queries, relevant_files)
+            ),
+            search_repeats,
+        ),
+    )
+
+    relevant_documents = asyncio.run(
+        query_processor._get_relevant_documents(queries, relevant_files)
+    )
+    for query, query_documents in zip(queries, relevant_documents):
+        query.set_relevant_documents(query_documents)
+    vectorstore = query_processor.vectorstore
+    record(
+        "scoring",
+        sum(len(query_documents) for query_documents in relevant_documents),
+        measure(
+            lambda: [
+                vectorstore.sort_by_score(
+                    vectorstore.add_scores(query.question_text, query_documents)
+                )
+                for query, query_documents in zip(queries, relevant_documents)
+            ],
+            repeats,
+        ),
+    )
+
+    # prompts are rendered for every step, the stub llm only echoes an answer
+    with tempfile.TemporaryDirectory() as output_path:
+        pipeline = StubCotPipeline(
+            settings=settings, queries=queries, output_path=Path(output_path)
+        )
+
+        def build_prompts() -> List[str]:
+            outputs = pipeline.step_1_cot()
+            outputs = pipeline.step_2_formatting(outputs)
+            return pipeline.step_3_schema_parsing(outputs)
+
+        record("prompt_building", len(queries), measure(build_prompts, repeats))
+
+        # clean json, fenced json and unparsable outputs, as returned by real llms
+        outputs = build_prompts()
+        outputs = list(
+            itertools.chain(
+                outputs,
+                [f"Answer:\n```json\n{output}\n```" for output in outputs],
+                [output[: len(output) // 2] for output in outputs],
+            )
+        )
+        pipeline.queries = queries * 3
+        record(
+            "answer_parsing",
+            len(outputs),
+            measure(lambda: pipeline.parse_answers(outputs), repeats),
+        )
+
+    return results
+
+
+def compare(
+    results: List[dict], baseline: List[dict], tolerance: float
+) -> Dict[str, float]:
+    baseline_by_stage = {result["stage"]: result for result in baseline}
+
+    ratios = {}
+    for result in results:
+        if result["stage"] not in baseline_by_stage:
+            continue
+
+        ratio = (
+            result["median_seconds"]
+            / baseline_by_stage[result["stage"]]["median_seconds"]
+        )
+        ratios[result["stage"]] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            logger.warning(f"{result['stage']}: {ratio:.2f}x slower than baseline")
+        elif ratio < 1 - tolerance:
+            logger.success(f"{result['stage']}: {1 / ratio:.2f}x faster than baseline")
+
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline timings of the pipeline stages over a synthetic corpus"
+    )
+    parser.add_argument("--data-path", type=Path, default=None)
+    parser.add_argument("--num-companies", type=int, default=10)
+    parser.add_argument("--files-per-company", type=int, default=1)
+    parser.add_argument("--elements-per-file", type=int, default=500)
+    parser.add_argument(
+        "--embeddings-model", default="sentence-transformers/all-MiniLM-L12-v2"
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--search-repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    # no api is called, but the settings require the keys
+    os.environ.setdefault("OPENAI_API_KEY", "")
+    os.environ.setdefault("HF_TOKEN", "")
+
+    if not args.verbose:
+        logger.disable("rag_3w_cot")
+
+    settings = Settings(
+        device="cpu",
+        force_gpu_cache_release=False,
+        embeddings_model=args.embeddings_model,
+        processing_query_enable_retrieval_cache=False,
+    )  # type: ignore
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        data_path = args.data_path or Path(tmp_path)
+        if not (data_path / "subset.json").exists():
+            generate_corpus(
+                data_path,
+                num_companies=args.num_companies,
+                files_per_company=args.files_per_company,
+                elements_per_file=args.elements_per_file,
+                seed=args.seed,
+            )
+
+        results = benchmark(
+            settings,
+            data_path,
+            repeats=args.repeats,
+            search_repeats=args.search_repeats,
+        )
+
+    if args.baseline:
+        ratios = compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        logger.info(f"Median time ratios vs baseline: {json.dumps(ratios)}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from loguru import logger
+
+COMPANY_PREFIXES = ["Acme", "Northwind", "Globex", "Initech", "Umbrella", "Stark"]
+COMPANY_PREFIXES += ["Wayne", "Tyrell", "Cyberdyne", "Soylent", "Vandelay", "Hooli"]
+COMPANY_SUFFIXES = ["Holdings Inc.", "Group Ltd", "Corp.", "Limited", "PLC", "AG"]
+
+METRICS = ["revenue", "net income", "operating cash flow", "total assets"]
+METRICS += ["capital expenditure", "research and development expenses", "dividends"]
+WORDS = ["the", "company", "reported", "an", "increase", "decrease", "of", "in"]
+WORDS += ["fiscal", "year", "compared", "to", "prior", "period", "driven", "by"]
+WORDS += ["higher", "lower", "demand", "costs", "segment", "results", "growth"]
+WORDS += ["board", "directors", "shareholders", "strategy", "risk", "market"]
+
+
+def get_company_names(num_companies: int) -> List[str]:
+    names = []
+    for i in range(num_companies):
+        prefix = COMPANY_PREFIXES[i % len(COMPANY_PREFIXES)]
+        suffix = COMPANY_SUFFIXES[(i // len(COMPANY_PREFIXES)) % len(COMPANY_SUFFIXES)]
+        round_ = i // (len(COMPANY_PREFIXES) * len(COMPANY_SUFFIXES))
+        names.append(f"{prefix} {suffix}" if not round_ else f"{prefix} {round_} {suffix}")
+
+    return names
+
+
+def get_amount(generator: np.random.Generator) -> str:
+    # thousands separators keep amounts from being mistaken for years
+    return f"{generator.uniform(1, 50_000):,.1f} million"
+
+
+def get_sentence(generator: np.random.Generator, company: str) -> str:
+    words = " ".join(generator.choice(WORDS, size=generator.integers(8, 24)))
+    metric = generator.choice(METRICS)
+    return f"{company} {metric} of USD {get_amount(generator)}, {words}."
+
+
+def get_table(generator: np.random.Generator, company: str) -> str:
+    rows = "".join(
+        f"<tr><td>{metric}</td><td>{get_amount(generator)}</td>"
+        f"<td>{get_amount(generator)}</td></tr>"
+        for metric in generator.choice(METRICS, size=4, replace=False)
+    )
+    return f"<table><tr><th>{company}</th><th>Current</th><th>Prior</th></tr>{rows}</table>"
+
+
+def get_element(sha1: str, page_index: int, text: str, html: str | None = None) -> dict:
+    metadata = {
+        "filename": f"{sha1}.pdf",
+        "filetype": "application/pdf",
+        "languages": ["eng"],
+        "page_number": page_index + 1,
+    }
+    if html is not None:
+        metadata["text_as_html"] = html
+
+    return {
+        "type": "Table" if html is not None else "NarrativeText",
+        "element_id": hashlib.md5(f"{sha1}{page_index}{text}".encode()).hexdigest(),
+        "text": text,
+        "metadata": metadata,
+    }
+
+
+def generate_elements(
+    generator: np.random.Generator,
+    sha1: str,
+    company: str,
+    year: int,
+    num_elements: int,
+    elements_per_page: int,
+    duplicate_ratio: float,
+    table_ratio: float,
+    small_ratio: float,
+) -> List[dict]:
+    # short title with the report year, as the year extraction expects
+    elements = [get_element(sha1, 0, f"{company} Annual Report {year}")]
+
+    texts: List[str] = []
+    for i in range(1, num_elements):
+        page_index = i // elements_per_page
+        draw = generator.random()
+
+        if texts and draw < duplicate_ratio / 2:
+            # exact duplicate (e.g. repeated headers), removed by deduplication
+            text = texts[generator.integers(len(texts))]
+        elif texts and draw < duplicate_ratio:
+            # near duplicate, removed by the similarity filters
+            text = texts[generator.integers(len(texts))].replace(
+                "the", "a", 1
+            ) + str(generator.integers(10))
+        elif draw < duplicate_ratio + small_ratio:
+            # short fragments (page numbers, captions), removed by size filtering
+            text = " ".join(generator.choice(WORDS, size=generator.integers(2, 6)))
+        elif draw < duplicate_ratio + small_ratio + table_ratio:
+            html = get_table(generator, company)
+            elements.append(get_element(sha1, page_index, html, html=html))
+            continue
+        else:
+            text = " ".join(
+                get_sentence(generator, company)
+                for _ in range(generator.integers(2, 8))
+            )
+
+        texts.append(text)
+        elements.append(get_element(sha1, page_index, text))
+
+    return elements
+
+
+def generate_corpus(
+    output_path: Path,
+    num_companies: int,
+    files_per_company: int = 1,
+    elements_per_file: int = 500,
+    elements_per_page: int = 10,
+    duplicate_ratio: float = 0.1,
+    table_ratio: float = 0.1,
+    small_ratio: float = 0.1,
+    seed: int = 0,
+) -> Dict[str, int]:
+    generator = np.random.default_rng(seed)
+    elements_path = output_path / "elements"
+    elements_path.mkdir(parents=True, exist_ok=True)
+
+    metadata, questions, true_answers = [], [], []
+    for company in get_company_names(num_companies):
+        for i in range(files_per_company):
+            sha1 = hashlib.sha1(f"{seed}{company}{i}".encode()).hexdigest()
+            # within the last ten years, as the year extraction expects
+            year = datetime.now().year - 1 - i % 9
+            elements = generate_elements(
+                generator,
+                sha1,
+                company,
+                year,
+                num_elements=elements_per_file,
+                elements_per_page=elements_per_page,
+                duplicate_ratio=duplicate_ratio,
+                table_ratio=table_ratio,
+                small_ratio=small_ratio,
+            )
+
+            # one planted fact per file, so retrieval has a known relevant page
+            num_pages = max(2, len(elements) // elements_per_page)
+            page_index = int(generator.integers(1, num_pages))
+            amount = get_amount(generator)
+            elements.append(
+                get_element(
+                    sha1,
+                    page_index,
+                    f"{company} paid total dividends of USD {amount} to shareholders "
+                    f"in fiscal year {year}, as approved by the board of directors.",
+                )
+            )
+
+            # the processors only need the file name, the content comes from the cache
+            (output_path / f"{sha1}.pdf").touch()
+            (elements_path / f"{sha1}.json").write_text(json.dumps(elements))
+
+            question = (
+                f"What was the total amount of dividends paid by {company} in "
+                f"fiscal year {year}? If data is not available, return 'N/A'."
+            )
+            metadata.append({"sha1": sha1, "company_name": company})
+            questions.append({"text": question, "kind": "number"})
+            true_answers.append(
+                {
+                    "question_text": question,
+                    "kind": "number",
+                    "value": float(amount.split()[0].replace(",", "")),
+                    "references": [{"pdf_sha1": sha1, "page_index": page_index}],
+                }
+            )
+
+    (output_path / "subset.json").write_text(json.dumps(metadata, indent=4))
+    (output_path / "questions.json").write_text(json.dumps(questions, indent=4))
+    (output_path / "true_answers.json").write_text(json.dumps(true_answers, indent=4))
+
+    stats = {
+        "companies": num_companies,
+        "files": len(metadata),
+        "elements": len(metadata) * (elements_per_file + 1),
+        "questions": len(questions),
+    }
+    logger.info(f"{output_path}: synthetic corpus {json.dumps(stats)}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Synthetic Unstructured-style JSON corpus with questions & answers"
+    )
+    parser.add_argument("output_path", type=Path)
+    parser.add_argument("--num-companies", type=int, default=10)
+    parser.add_argument("--files-per-company", type=int, default=1)
+    parser.add_argument("--elements-per-file", type=int, default=500)
+    parser.add_argument("--elements-per-page", type=int, default=10)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--table-ratio", type=float, default=0.1)
+    parser.add_argument("--small-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_corpus(
+        args.output_path,
+        num_companies=args.num_companies,
+        files_per_company=args.files_per_company,
+        elements_per_file=args.elements_per_file,
+        elements_per_page=args.elements_per_page,
+        duplicate_ratio=args.duplicate_ratio,
+        table_ratio=args.table_ratio,
+        small_ratio=args.small_ratio,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import json
 import time
-import traceback
 import warnings
 from datetime import datetime
 from pathlib import Path
@@ -9,13 +8,8 @@ from typing import List
 from dotenv import load_dotenv
 from loguru import logger
 
-from rag_3w_cot.evaluations import (
-    BaseEvaluation,
-    BERTScoreEvaluation,
-    EmbeddingCosineSimilarityEvaluation,
-    ExactMatchEvaluation,
-    RougeScoreEvaluation,
-)
+from rag_3w_cot.embeddings import EmbeddingsFactory
+from rag_3w_cot.evaluations import EvaluationRunner, RetrievalEvaluation
 from rag_3w_cot.models import Answer, Query
 from rag_3w_cot.pipelines import CotPipeline
 from rag_3w_cot.processors import DocumentProcessor, QueryProcessor
@@ -110,6 +104,20 @@ def run_pipeline(
     for i, query in enumerate(queries, start=1):
         query.export(output_path / f"query_{i}.json")
 
+    if true_answers:
+        retrieval_scores = RetrievalEvaluation(
+            settings=settings, queries=queries, true_answers=true_answers
+        ).get_scores()
+        logger.success(f"Retrieval scores: {json.dumps(retrieval_scores, indent=4)}")
+        (output_path / "retrieval_scores.json").write_text(
+            json.dumps(retrieval_scores, indent=4)
+        )
+
+    # the LLM needs the GPU memory held by the embeddings model
+    document_processor.close()
+    query_processor.close()
+    EmbeddingsFactory.unload()
+
     ###### Pipeline
 
     pipeline = CotPipeline(settings=settings, queries=queries, output_path=output_path)
@@ -133,26 +141,9 @@ def run_pipeline(
     if not true_answers:
         return
 
-    evaluations = [
-        EmbeddingCosineSimilarityEvaluation,
-        ExactMatchEvaluation,
-        BERTScoreEvaluation,
-        RougeScoreEvaluation,
-    ]
-
-    scores = {}
-    for evaluation in evaluations:
-        try:
-            target: BaseEvaluation = evaluation(
-                settings=settings,
-                answers=answers,
-                true_answers=true_answers,
-            )
-            scores[evaluation.__name__] = target.get_score()
-        except Exception as e:
-            tb = traceback.format_exc()
-            logger.error(f"Error calling evaluation {evaluation.__name__}: {e} -> {tb}")
-            scores[evaluation.__name__] = -1
+    scores = EvaluationRunner(
+        settings=settings, answers=answers, true_answers=true_answers
+    ).run()
 
     logger.success(f"Scores: {json.dumps(scores, indent=4)}")
 
@@ -0,0 +1,43 @@
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from rag_3w_cot.settings import Settings
+from rag_3w_cot.sweeps import SweepRunner
+
+from rag_3w_cot_pipeline import load_queries, load_true_answers
+
+load_dotenv()
+warnings.filterwarnings("ignore")
+
+
+if __name__ == "__main__":
+    data_path = Path("samples/data")
+
+    settings = Settings(
+        llm="Qwen257B",
+        llm_batch_size=2,
+        llm_quantization_type="int4",
+        processing_max_concurrent_tasks=4,
+        unstructured_strategy="hi_res",
+    )  # type: ignore
+
+    # only the retrieve stage (and downstream) runs once per grid point
+    runner = SweepRunner(
+        settings=settings,
+        grid={
+            "processing_query_similarity_document_text_top_k": [10, 20, 40],
+            "processing_query_similarity_document_text_lambda_mult": [0.5, 1.0],
+        },
+        data_path=data_path,
+        metadata_file=data_path / "subset.json",
+        output_path=data_path / "sweeps" / datetime.now().strftime("%Y%m%d_%H%M%S"),
+        queries=load_queries(data_path),
+        true_answers=load_true_answers(data_path),
+    )
+
+    for result in runner.run():
+        logger.success(f"{result['params']}: {result['scores']}")
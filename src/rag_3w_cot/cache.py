@@ -0,0 +1,148 @@
+import argparse
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+from loguru import logger
+from pydantic import BaseModel
+
+LAST_ACCESS_FILE = ".last_access"
+
+
+class CacheEntry(BaseModel):
+    type_: str
+    hash: str
+    path: Path
+    size_bytes: int
+    last_access: float
+
+    @property
+    def size_mb(self) -> float:
+        return self.size_bytes / 1024**2
+
+    def describe(self) -> str:
+        last_access = datetime.fromtimestamp(self.last_access).isoformat(
+            sep=" ", timespec="seconds"
+        )
+        return f"{self.type_:<14} {self.hash}  {self.size_mb:>10.2f} MB  {last_access}"
+
+
+class CacheManager(BaseModel):
+    cache_dir: Path
+    max_size_bytes: Optional[int] = None
+
+    @staticmethod
+    def touch(entry_path: Path):
+        entry_path.mkdir(parents=True, exist_ok=True)
+        (entry_path / LAST_ACCESS_FILE).touch()
+
+    @staticmethod
+    def get_size_bytes(path: Path) -> int:
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+    @staticmethod
+    def get_last_access(entry_path: Path) -> float:
+        marker = entry_path / LAST_ACCESS_FILE
+        return (marker if marker.exists() else entry_path).stat().st_mtime
+
+    def entries(self) -> List[CacheEntry]:
+        if not self.cache_dir.is_dir():
+            return []
+
+        entries = []
+        for type_path in sorted(self.cache_dir.glob(".*")):
+            if not type_path.is_dir():
+                continue
+
+            for entry_path in type_path.iterdir():
+                if not entry_path.is_dir():
+                    continue
+
+                entries.append(
+                    CacheEntry(
+                        type_=type_path.name.lstrip("."),
+                        hash=entry_path.name,
+                        path=entry_path,
+                        size_bytes=self.get_size_bytes(entry_path),
+                        last_access=self.get_last_access(entry_path),
+                    )
+                )
+
+        return sorted(entries, key=lambda entry: entry.last_access)
+
+    def size_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self.entries())
+
+    def remove(self, entry: CacheEntry):
+        logger.warning(f"Removing cache {entry.path} ({entry.size_mb:.2f} MB)...")
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+    def evict(self, keep: Optional[Iterable[Path]] = None) -> List[CacheEntry]:
+        if self.max_size_bytes is None:
+            return []
+
+        protected: Set[Path] = {path.resolve() for path in keep or []}
+        entries = self.entries()
+        total_size = sum(entry.size_bytes for entry in entries)
+
+        evicted = []
+        for entry in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if entry.path.resolve() in protected:
+                continue
+
+            self.remove(entry)
+            total_size -= entry.size_bytes
+            evicted.append(entry)
+
+        if total_size > self.max_size_bytes:
+            logger.error(
+                f"{self.cache_dir}: cache size {total_size / 1024**2:.2f} MB still exceeds the budget (entries in use)"
+            )
+
+        return evicted
+
+    def gc(self, max_age_days: float) -> List[CacheEntry]:
+        threshold = time.time() - max_age_days * 24 * 60 * 60
+        evicted = [entry for entry in self.entries() if entry.last_access < threshold]
+        for entry in evicted:
+            self.remove(entry)
+
+        return evicted
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect & evict rag-3w-cot caches")
+    parser.add_argument("command", choices=["list", "evict", "gc"])
+    parser.add_argument("data_path", type=Path)
+    parser.add_argument("--max-size-gb", type=float, default=None)
+    parser.add_argument("--max-age-days", type=float, default=30.0)
+    parsed = parser.parse_args(args)
+
+    max_size_bytes = (
+        int(parsed.max_size_gb * 1024**3) if parsed.max_size_gb is not None else None
+    )
+    manager = CacheManager(
+        cache_dir=parsed.data_path / ".cache", max_size_bytes=max_size_bytes
+    )
+
+    match parsed.command:
+        case "list":
+            entries = manager.entries()
+            for entry in entries:
+                print(entry.describe())
+            total_size = sum(entry.size_bytes for entry in entries)
+            print(f"{len(entries)} cache(s), {total_size / 1024**2:.2f} MB")
+        case "evict":
+            if max_size_bytes is None:
+                parser.error("evict requires --max-size-gb")
+            manager.evict()
+        case "gc":
+            manager.gc(parsed.max_age_days)
+
+
+if __name__ == "__main__":
+    main()
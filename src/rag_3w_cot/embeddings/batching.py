@@ -0,0 +1,64 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+from loguru import logger
+
+
+class TokenBudgetHuggingFaceEmbeddings(HuggingFaceEmbeddings):
+    token_budget: Optional[int] = None
+
+    def get_token_lengths(self, texts: List[str]) -> np.ndarray:
+        input_ids = self._client.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self._client.max_seq_length,
+        )["input_ids"]
+        return np.asarray([len(ids) for ids in input_ids], dtype=np.int64)
+
+    def get_batches(self, lengths: np.ndarray) -> List[np.ndarray]:
+        # longest first (stable), so each batch is padded to its first text
+        order = np.argsort(-lengths, kind="stable")
+
+        batches, start = [], 0
+        while start < len(order):
+            max_length = max(int(lengths[order[start]]), 1)
+            size = max(self.token_budget // max_length, 1)  # pyright: ignore
+            batches.append(order[start : start + size])
+            start += size
+
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not self.token_budget or self.multi_process or len(texts) <= 1:
+            return super().embed_documents(texts)
+
+        start = time.perf_counter()
+        texts = [text.replace("\n", " ") for text in texts]
+        encode_kwargs = {
+            key: value
+            for key, value in self.encode_kwargs.items()
+            if key != "batch_size"
+        }
+
+        batches = self.get_batches(self.get_token_lengths(texts))
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in batches:
+            batch_embeddings = self._client.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                **encode_kwargs,
+            )
+            # back to the original order
+            for i, embedding in zip(batch, batch_embeddings.tolist()):
+                embeddings[i] = embedding
+
+        seconds = time.perf_counter() - start
+        logger.debug(
+            f"Embedded {len(texts)} chunk(s) in {len(batches)} batch(es) "
+            f"of up to {self.token_budget} tokens: {len(texts) / seconds:.2f} chunks/s"
+        )
+
+        return embeddings  # pyright: ignore
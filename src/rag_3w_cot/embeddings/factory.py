@@ -1,14 +1,30 @@
-from typing import Callable, Dict
+import threading
+from typing import Callable, Dict, Optional, Tuple
 
 from langchain_core.embeddings import Embeddings
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
+from loguru import logger
 
+from rag_3w_cot.embeddings.batching import TokenBudgetHuggingFaceEmbeddings
+from rag_3w_cot.embeddings.onnx import create_onnx_embeddings
 from rag_3w_cot.settings import Settings
+from rag_3w_cot.utils import force_gpu_cache_release
 
 
 class EmbeddingsFactory:
     registry: Dict[str, Callable] = {}
+    models: Dict[Tuple, Embeddings] = {}
+    models_lock = threading.Lock()
+
+    @staticmethod
+    def get_model_key(settings: Settings) -> Tuple:
+        # only what identifies the loaded weights, encoding knobs are per settings
+        return (
+            settings.embeddings_model,
+            settings.device,
+            settings.embeddings_huggingface_backend,
+            settings.embeddings_huggingface_onnx_quantization,
+        )
 
     @classmethod
     def register(cls, model, creator: Callable[[Settings], Embeddings]):
@@ -19,12 +35,52 @@ class EmbeddingsFactory:
         try:
             return cls.registry[settings.embeddings_model](settings)
         except KeyError:
-            return cls.registry["huggingface"](settings)
+            match settings.embeddings_huggingface_backend:
+                case "onnx":
+                    return cls.registry["huggingface-onnx"](settings)
+                case _:
+                    return cls.registry["huggingface"](settings)
+
+    @classmethod
+    def get_model(cls, settings: Settings) -> Embeddings:
+        key = cls.get_model_key(settings)
+        with cls.models_lock:
+            if key not in cls.models:
+                logger.debug(f"Loading embeddings model {settings.embeddings_model}...")
+                cls.models[key] = cls.create_model(settings)
+
+            model = cls.models[key]
+
+        if isinstance(model, TokenBudgetHuggingFaceEmbeddings):
+            # a shallow copy shares the loaded weights (the onnx session threads too)
+            return model.model_copy(
+                update={
+                    "encode_kwargs": {
+                        **model.encode_kwargs,
+                        "precision": settings.embeddings_huggingface_precision,
+                        "batch_size": settings.embeddings_huggingface_batch_size,
+                    },
+                    "token_budget": settings.embeddings_huggingface_token_budget,
+                }
+            )
+
+        return model
+
+    @classmethod
+    def unload(cls, settings: Optional[Settings] = None):
+        with cls.models_lock:
+            if settings is None:
+                cls.models.clear()
+            else:
+                cls.models.pop(cls.get_model_key(settings), None)
+
+        # only released once no processor/evaluation holds the model anymore
+        force_gpu_cache_release()
 
 
 EmbeddingsFactory.register(
     "huggingface",
-    lambda settings: HuggingFaceEmbeddings(
+    lambda settings: TokenBudgetHuggingFaceEmbeddings(
         model_name=settings.embeddings_model,
         model_kwargs={"device": settings.device},
         encode_kwargs={
@@ -32,9 +88,12 @@ EmbeddingsFactory.register(
             "precision": settings.embeddings_huggingface_precision,
             "batch_size": settings.embeddings_huggingface_batch_size,
         },
+        token_budget=settings.embeddings_huggingface_token_budget,
     ),
 )
 
+EmbeddingsFactory.register("huggingface-onnx", create_onnx_embeddings)
+
 EmbeddingsFactory.register(
     "openai/text-embedding-3-small",
     lambda settings: OpenAIEmbeddings(
@@ -0,0 +1,89 @@
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+from sentence_transformers import (
+    SentenceTransformer,
+    export_dynamic_quantized_onnx_model,
+)
+
+from rag_3w_cot.embeddings.batching import TokenBudgetHuggingFaceEmbeddings
+from rag_3w_cot.settings import Settings
+
+# see: https://sbert.net/docs/sentence_transformer/usage/efficiency.html
+ONNX_QUANTIZATIONS = ("none", "arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def get_onnx_file_name(quantization: str) -> str:
+    if quantization == "none":
+        return "onnx/model.onnx"
+    return f"onnx/model_qint8_{quantization}.onnx"
+
+
+def get_onnx_model_path(settings: Settings) -> Path:
+    return (
+        settings.embeddings_huggingface_onnx_path
+        / settings.embeddings_model.replace("/", "--")
+    )
+
+
+def get_session_options(threads: Optional[int]):
+    # optional, installed with the "onnx" extra (optimum[onnxruntime])
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+
+    return session_options
+
+
+def export_onnx_model(settings: Settings) -> Path:
+    quantization = settings.embeddings_huggingface_onnx_quantization
+    model_path = get_onnx_model_path(settings)
+    if (model_path / get_onnx_file_name(quantization)).exists():
+        return model_path
+
+    logger.info(
+        f"Exporting {settings.embeddings_model} to ONNX "
+        f"(quantization: {quantization}) at {model_path}"
+    )
+    model = SentenceTransformer(settings.embeddings_model, device="cpu", backend="onnx")
+    model.save_pretrained(str(model_path))
+
+    if quantization != "none":
+        # dynamic int8 quantization of the weights, activations stay float32
+        export_dynamic_quantized_onnx_model(
+            model,
+            quantization,  # pyright: ignore
+            str(model_path),
+        )
+
+    return model_path
+
+
+def create_onnx_embeddings(settings: Settings) -> TokenBudgetHuggingFaceEmbeddings:
+    model_path = export_onnx_model(settings)
+    return TokenBudgetHuggingFaceEmbeddings(
+        model_name=str(model_path),
+        model_kwargs={
+            "device": "cpu",
+            "backend": "onnx",
+            "model_kwargs": {
+                "file_name": get_onnx_file_name(
+                    settings.embeddings_huggingface_onnx_quantization
+                ),
+                "provider": "CPUExecutionProvider",
+                "session_options": get_session_options(
+                    settings.embeddings_huggingface_onnx_threads
+                ),
+            },
+        },
+        encode_kwargs={
+            "normalize_embeddings": True,
+            "precision": settings.embeddings_huggingface_precision,
+            "batch_size": settings.embeddings_huggingface_batch_size,
+        },
+        token_budget=settings.embeddings_huggingface_token_budget,
+    )
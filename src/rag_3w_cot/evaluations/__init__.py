@@ -3,7 +3,9 @@ from .bert_score import BERTScoreEvaluation
 from .cosine_similarity import CosineSimilarityEvaluation
 from .embedding_cosine_similarity import EmbeddingCosineSimilarityEvaluation
 from .exact_match import ExactMatchEvaluation
+from .retrieval import RetrievalEvaluation
 from .rouge_score import RougeScoreEvaluation
+from .runner import EvaluationRunner
 
 __all__ = [
     "BaseEvaluation",
@@ -12,4 +14,6 @@ __all__ = [
     "ExactMatchEvaluation",
     "BERTScoreEvaluation",
     "RougeScoreEvaluation",
+    "RetrievalEvaluation",
+    "EvaluationRunner",
 ]
@@ -1,5 +1,7 @@
-from typing import Any, List, Tuple
+from functools import cached_property
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 from langchain_core.embeddings import Embeddings
 from pydantic import BaseModel
 
@@ -19,21 +21,22 @@ class BaseEvaluation(BaseModel):
 
     @property
     def embeddings(self) -> Embeddings:
-        return EmbeddingsFactory.create_model(self.settings)
+        return EmbeddingsFactory.get_model(self.settings)
 
-    @property
+    @cached_property
     def parsed_data(self) -> List[Tuple[str, Any, Any]]:
+        # first answer per question, as a dict join instead of a scan per question
+        answers_by_question: Dict[str, Answer] = {}
+        for answer in self.answers:
+            answers_by_question.setdefault(answer.question_text, answer)
+
         evaluation_data = []
         for true_answer in self.true_answers:
             true_answer_string = str(true_answer.value or "").strip().lower()
-            filtered_answers = list(
-                filter(
-                    lambda a: a.question_text == true_answer.question_text, self.answers
-                )
-            )
+            answer = answers_by_question.get(true_answer.question_text)
 
-            if filtered_answers:
-                answer_string = str(filtered_answers[0].value or "").strip().lower()
+            if answer is not None:
+                answer_string = str(answer.value or "").strip().lower()
                 evaluation_data.append(
                     (true_answer.question_text, answer_string, true_answer_string)
                 )
@@ -44,7 +47,7 @@ class BaseEvaluation(BaseModel):
 
         return evaluation_data
 
-    @property
+    @cached_property
     def _answer_true_answer_pairs(self) -> List[Tuple[str, str]]:
         return [(str(data[1]), str(data[2])) for data in self.parsed_data]
 
@@ -54,5 +57,13 @@ class BaseEvaluation(BaseModel):
         if self.settings.force_gpu_cache_release:
             force_gpu_cache_release()
 
-    def get_score(self) -> float:
+    @property
+    def cache_key(self) -> str:
+        return type(self).__name__
+
+    def get_pair_scores(self, pairs: List[Tuple[str, str]]) -> List[float]:
         raise NotImplementedError()
+
+    def get_score(self) -> float:
+        scores = self.get_pair_scores(self._answer_true_answer_pairs)
+        return float(np.mean(scores or 0.0))
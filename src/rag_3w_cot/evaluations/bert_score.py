@@ -1,4 +1,7 @@
-import bert_score
+from functools import lru_cache
+from typing import List, Tuple
+
+from bert_score import BERTScorer
 
 from rag_3w_cot.utils import (
     force_gpu_cache_release,
@@ -7,15 +10,21 @@ from rag_3w_cot.utils import (
 from .base import BaseEvaluation
 
 
+@lru_cache
+def bert_scorer(lang: str = "en") -> BERTScorer:
+    return BERTScorer(lang=lang)
+
+
 class BERTScoreEvaluation(BaseEvaluation):
-    def get_score(self) -> float:
+    def get_pair_scores(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        if not pairs:
+            return []
+
         if self.settings.force_gpu_cache_release:
             force_gpu_cache_release()
 
-        answers_strings = [answer for answer, _ in self._answer_true_answer_pairs]
-        true_answers_strings = [
-            true_answer for _, true_answer in self._answer_true_answer_pairs
-        ]
+        answers_strings = [answer for answer, _ in pairs]
+        true_answers_strings = [true_answer for _, true_answer in pairs]
 
-        *_, F1 = bert_score.score(answers_strings, true_answers_strings, lang="en")
-        return F1.mean().item()  # pyright: ignore
+        *_, F1 = bert_scorer().score(answers_strings, true_answers_strings)
+        return F1.tolist()  # pyright: ignore
@@ -0,0 +1,71 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
+from typing import IO, Callable, Dict
+
+import numpy as np
+from pydantic import BaseModel
+
+# sweep runners evaluate in threads, saves merge & replace one at a time
+SAVE_LOCK = threading.Lock()
+
+
+def replace_file(path: Path, write: Callable[[IO[bytes]], None]):
+    # unique temporary file, concurrent runners may save the same cache
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as file:
+        write(file)
+
+    tmp_path = Path(file.name)
+    try:
+        tmp_path.replace(path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+class EmbeddingsCache(BaseModel):
+    path: Path
+
+    def load(self) -> Dict[str, np.ndarray]:
+        if not self.path.exists():
+            return {}
+
+        with np.load(self.path, allow_pickle=False) as data:
+            return dict(zip(data["texts"].tolist(), data["vectors"]))
+
+    def save(self, embeddings: Dict[str, np.ndarray]):
+        if not embeddings:
+            return
+
+        with SAVE_LOCK:
+            # keep the entries saved by other runners since this one loaded the cache
+            embeddings = {**self.load(), **embeddings}
+            replace_file(
+                self.path,
+                lambda file: np.savez(
+                    file,
+                    texts=np.asarray(list(embeddings), dtype=str),
+                    vectors=np.stack(list(embeddings.values())).astype(np.float32),
+                ),
+            )
+
+
+class ScoresCache(BaseModel):
+    path: Path
+
+    def load(self) -> Dict[str, float]:
+        if not self.path.exists():
+            return {}
+
+        return json.loads(self.path.read_text())
+
+    def save(self, scores: Dict[str, float]):
+        with SAVE_LOCK:
+            # keep the entries saved by other runners since this one loaded the cache
+            scores = {**self.load(), **scores}
+            replace_file(
+                self.path, lambda file: file.write(json.dumps(scores).encode())
+            )
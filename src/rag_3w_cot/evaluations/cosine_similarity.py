@@ -1,4 +1,4 @@
-import numpy as np
+from typing import List, Tuple
 
 from rag_3w_cot.utils import get_cosine_similarity
 
@@ -6,11 +6,8 @@ from .base import BaseEvaluation
 
 
 class CosineSimilarityEvaluation(BaseEvaluation):
-    def get_score(self) -> float:
-        similarities = []
-        for answer, true_answer in self._answer_true_answer_pairs:
-            similarities.append(
-                get_cosine_similarity(answer, true_answer, stop_words=False)
-            )
-
-        return float(np.mean(similarities or 0.0))
+    def get_pair_scores(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        return [
+            get_cosine_similarity(answer, true_answer, stop_words=False)
+            for answer, true_answer in pairs
+        ]
@@ -1,18 +1,73 @@
+import hashlib
+from pathlib import Path
+from typing import List, Tuple
+
 import numpy as np
 
-from rag_3w_cot.utils import get_vector_cosine_similarity
+from rag_3w_cot.settings import STAGE_FIELDS
 
 from .base import BaseEvaluation
+from .cache import EmbeddingsCache
 
 
 class EmbeddingCosineSimilarityEvaluation(BaseEvaluation):
-    def get_score(self) -> float:
-        similarities = []
-        for answer, true_answer in self._answer_true_answer_pairs:
-            answer_embedding = self.embeddings.embed_query(answer)
-            true_answer_embedding = self.embeddings.embed_query(true_answer)
-            similarities.append(
-                get_vector_cosine_similarity(answer_embedding, true_answer_embedding)
+    @property
+    def enable_cache(self) -> bool:
+        return self.settings.evaluation_enable_cache
+
+    @property
+    def model_hash(self) -> str:
+        # the embeddings settings the index is keyed by, throughput knobs excluded
+        model_key = "".join(
+            str(getattr(self.settings, field))
+            for field in STAGE_FIELDS["index"]
+            if field.startswith("embeddings_")
+        )
+        return hashlib.md5(model_key.encode()).hexdigest()
+
+    @property
+    def cache_key(self) -> str:
+        return f"{type(self).__name__}_{self.model_hash}"
+
+    @property
+    def embeddings_cache_path(self) -> Path:
+        return (
+            self.settings.evaluation_cache_path
+            / "embeddings"
+            / f"{self.model_hash}.npz"
+        )
+
+    def embed(self, answers: List[str], true_answers: List[str]) -> tuple:
+        # true answers are fixed across runs, only answers are always embedded
+        cache = EmbeddingsCache(path=self.embeddings_cache_path)
+        cached = cache.load() if self.enable_cache else {}
+
+        texts = list(
+            dict.fromkeys(
+                answers + [text for text in true_answers if text not in cached]
             )
+        )
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        embeddings = {**cached, **dict(zip(texts, vectors))}
+
+        if self.enable_cache and any(text not in cached for text in true_answers):
+            cache.save({**cached, **{text: embeddings[text] for text in true_answers}})
+
+        return (
+            np.stack([embeddings[text] for text in answers]),
+            np.stack([embeddings[text] for text in true_answers]),
+        )
+
+    def get_pair_scores(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        if not pairs:
+            return []
+
+        answers, true_answers = map(list, zip(*pairs))
+        answer_vectors, true_answer_vectors = self.embed(answers, true_answers)
 
-        return float(np.mean(similarities or 0.0))
+        # row-wise cosine similarity of each answer and its true answer
+        similarities = np.einsum("ij,ij->i", answer_vectors, true_answer_vectors) / (
+            np.linalg.norm(answer_vectors, axis=1)
+            * np.linalg.norm(true_answer_vectors, axis=1)
+        )
+        return similarities.tolist()
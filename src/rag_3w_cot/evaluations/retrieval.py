@@ -0,0 +1,100 @@
+from functools import cached_property
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from rag_3w_cot.models import Answer, Query
+from rag_3w_cot.settings import Settings
+
+Page = Tuple[str, int]
+
+
+class RetrievalEvaluation(BaseModel):
+    settings: Settings
+
+    queries: List[Query]
+    true_answers: List[Answer]
+
+    @property
+    def k_values(self) -> List[int]:
+        return self.settings.evaluation_retrieval_k
+
+    @cached_property
+    def parsed_data(self) -> List[Tuple[List[Page], Set[Page]]]:
+        true_answers_by_question: Dict[str, Answer] = {}
+        for true_answer in self.true_answers:
+            true_answers_by_question.setdefault(true_answer.question_text, true_answer)
+
+        evaluation_data = []
+        for query in self.queries:
+            true_answer = true_answers_by_question.get(query.question_text)
+            # questions without references (e.g. N/A answers) have nothing to retrieve
+            if true_answer is None or not true_answer.references:
+                continue
+
+            relevant_pages = {
+                (reference.pdf_sha1, reference.page_index)
+                for reference in true_answer.references
+            }
+            evaluation_data.append((self.get_retrieved_pages(query), relevant_pages))
+
+        return evaluation_data
+
+    @staticmethod
+    def get_retrieved_pages(query: Query) -> List[Page]:
+        # several chunks of the same page are retrieved once, at their best rank
+        pages: Dict[Page, None] = {}
+        for document in query.get_relevant_documents():
+            if (
+                "pdf_sha1" not in document.metadata
+                or "page_index" not in document.metadata
+            ):
+                continue
+
+            page = (
+                str(document.metadata["pdf_sha1"]),
+                int(document.metadata["page_index"]),
+            )
+            pages.setdefault(page, None)
+
+        return list(pages)
+
+    def get_relevance(self) -> Tuple[np.ndarray, np.ndarray]:
+        max_retrieved = max(
+            [len(retrieved) for retrieved, _ in self.parsed_data] + [max(self.k_values)]
+        )
+
+        # queries x ranks, padded with non relevant ranks
+        relevance = np.zeros((len(self.parsed_data), max_retrieved), dtype=bool)
+        num_relevant = np.zeros(len(self.parsed_data), dtype=np.int64)
+        for i, (retrieved, relevant_pages) in enumerate(self.parsed_data):
+            relevance[i, : len(retrieved)] = [
+                page in relevant_pages for page in retrieved
+            ]
+            num_relevant[i] = len(relevant_pages)
+
+        return relevance, num_relevant
+
+    def get_scores(self) -> Dict[str, float]:
+        if not self.parsed_data:
+            return {}
+
+        relevance, num_relevant = self.get_relevance()
+        discounts = 1.0 / np.log2(np.arange(2, relevance.shape[1] + 2))
+
+        scores = {}
+        for k in self.k_values:
+            hits = relevance[:, :k]
+            scores[f"recall@{k}"] = float(np.mean(hits.sum(axis=1) / num_relevant))
+
+            dcg = hits @ discounts[:k]
+            ideal_dcg = np.cumsum(discounts[:k])[np.minimum(num_relevant, k) - 1]
+            scores[f"ndcg@{k}"] = float(np.mean(dcg / ideal_dcg))
+
+        # reciprocal rank of the first relevant page, 0.0 when none was retrieved
+        first_hits = np.argmax(relevance, axis=1)
+        reciprocal_ranks = np.where(relevance.any(axis=1), 1.0 / (first_hits + 1), 0.0)
+        scores["mrr"] = float(np.mean(reciprocal_ranks))
+
+        return scores
@@ -1,18 +1,29 @@
+from functools import lru_cache
+from typing import List, Tuple
+
 import evaluate
 import numpy as np
 
 from .base import BaseEvaluation
 
 
+@lru_cache
+def rouge_metric() -> evaluate.EvaluationModule:
+    return evaluate.load("rouge")
+
+
 class RougeScoreEvaluation(BaseEvaluation):
-    def get_score(self):
-        answers_strings = [answer for answer, _ in self._answer_true_answer_pairs]
-        true_answers_strings = [
-            true_answer for _, true_answer in self._answer_true_answer_pairs
-        ]
-
-        rouge = evaluate.load("rouge")
-        scores = rouge.compute(
-            predictions=answers_strings, references=true_answers_strings
+    def get_pair_scores(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        if not pairs:
+            return []
+
+        answers_strings = [answer for answer, _ in pairs]
+        true_answers_strings = [true_answer for _, true_answer in pairs]
+
+        # per pair (no bootstrap aggregation), mean of rouge1/rouge2/rougeL/rougeLsum
+        scores = rouge_metric().compute(
+            predictions=answers_strings,
+            references=true_answers_strings,
+            use_aggregator=False,
         )
-        return float(np.mean([score for score in (scores or {}).values()])) or 0.0
+        return np.mean(list((scores or {}).values()), axis=0).tolist()
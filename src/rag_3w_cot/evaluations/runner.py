@@ -0,0 +1,101 @@
+import hashlib
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple, Type
+
+import numpy as np
+from loguru import logger
+from pydantic import BaseModel
+
+from rag_3w_cot.models import Answer
+from rag_3w_cot.settings import Settings
+
+from .base import BaseEvaluation
+from .bert_score import BERTScoreEvaluation
+from .cache import ScoresCache
+from .embedding_cosine_similarity import EmbeddingCosineSimilarityEvaluation
+from .exact_match import ExactMatchEvaluation
+from .rouge_score import RougeScoreEvaluation
+
+
+class EvaluationRunner(BaseModel):
+    settings: Settings
+
+    answers: List[Answer]
+    true_answers: List[Answer]
+    evaluations: List[Type[BaseEvaluation]] = [
+        EmbeddingCosineSimilarityEvaluation,
+        ExactMatchEvaluation,
+        BERTScoreEvaluation,
+        RougeScoreEvaluation,
+    ]
+
+    @property
+    def enable_cache(self) -> bool:
+        return self.settings.evaluation_enable_cache
+
+    @property
+    def max_concurrent_tasks(self) -> int:
+        return self.settings.evaluation_max_concurrent_tasks
+
+    def get_scores_cache_path(self, evaluation: BaseEvaluation) -> Path:
+        return (
+            self.settings.evaluation_cache_path
+            / "scores"
+            / f"{evaluation.cache_key}.json"
+        )
+
+    @staticmethod
+    def get_pair_hash(pair: Tuple[str, str]) -> str:
+        return hashlib.md5("\0".join(pair).encode()).hexdigest()
+
+    def run(self) -> Dict[str, float]:
+        # metrics are independent, their models are loaded once per process
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_tasks) as executor:
+            scores = list(executor.map(self.get_score, self.evaluations))
+
+        return dict(
+            zip([evaluation.__name__ for evaluation in self.evaluations], scores)
+        )
+
+    def get_score(self, evaluation_cls: Type[BaseEvaluation]) -> float:
+        try:
+            evaluation = evaluation_cls(
+                settings=self.settings,
+                answers=self.answers,
+                true_answers=self.true_answers,
+            )
+            pair_scores = self.get_pair_scores(evaluation)
+            return float(np.mean(pair_scores or 0.0))
+        except Exception as e:
+            tb = traceback.format_exc()
+            logger.error(
+                f"Error calling evaluation {evaluation_cls.__name__}: {e} -> {tb}"
+            )
+            return -1
+
+    def get_pair_scores(self, evaluation: BaseEvaluation) -> List[float]:
+        pairs = evaluation._answer_true_answer_pairs
+        if not self.enable_cache:
+            return evaluation.get_pair_scores(pairs)
+
+        cache = ScoresCache(path=self.get_scores_cache_path(evaluation))
+        cached = cache.load()
+
+        # only pairs never scored before, e.g. answers changed since the last run
+        hashes = [self.get_pair_hash(pair) for pair in pairs]
+        missing = {
+            pair_hash: pair
+            for pair_hash, pair in zip(hashes, pairs)
+            if pair_hash not in cached
+        }
+        if missing:
+            logger.debug(
+                f"{type(evaluation).__name__}: scoring {len(missing)} of {len(pairs)} answer(s)..."
+            )
+            scores = evaluation.get_pair_scores(list(missing.values()))
+            cached.update(zip(missing, scores))
+            cache.save(cached)
+
+        return [cached[pair_hash] for pair_hash in hashes]
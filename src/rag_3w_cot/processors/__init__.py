@@ -1,5 +1,13 @@
 from .base import BaseProcessor
+from .deduplicator import MinHashDeduplicator
 from .document import DocumentProcessor
+from .metadata import MetadataIndex
 from .query import QueryProcessor
 
-__all__ = ["BaseProcessor", "DocumentProcessor", "QueryProcessor"]
+__all__ = [
+    "BaseProcessor",
+    "DocumentProcessor",
+    "MetadataIndex",
+    "MinHashDeduplicator",
+    "QueryProcessor",
+]
@@ -1,18 +1,21 @@
 import asyncio
-import hashlib
 import importlib
+import shutil
 from functools import cached_property
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Dict, List
 
 import pandas as pd
 from loguru import logger
 from pydantic import BaseModel
 
+from rag_3w_cot.cache import CacheManager
 from rag_3w_cot.embeddings import EmbeddingsFactory
 from rag_3w_cot.settings import Settings
 from rag_3w_cot.vectorstores import BaseVectorStore
 
+from .metadata import MetadataIndex
+
 
 class BaseProcessor(BaseModel):
     settings: Settings
@@ -23,6 +26,13 @@ class BaseProcessor(BaseModel):
     def enable_cache(self) -> bool:
         return self.settings.processing_enable_cache
 
+    @property
+    def cache_max_size_bytes(self) -> int | None:
+        if self.settings.processing_cache_max_size_gb is None:
+            return None
+
+        return int(self.settings.processing_cache_max_size_gb * 1024**3)
+
     @property
     def force_gpu_cache_release(self) -> bool:
         return self.settings.force_gpu_cache_release
@@ -31,9 +41,19 @@ class BaseProcessor(BaseModel):
     def max_concurrent_tasks(self) -> int:
         return self.settings.processing_max_concurrent_tasks
 
+    @property
+    def cache_types(self) -> List[str]:
+        return ["vectorstore", "json"]
+
+    @property
+    def cache_dirs(self) -> List[Path]:
+        return [
+            self.cache_path(self.data_path, type_).parent for type_ in self.cache_types
+        ]
+
     @cached_property
     def vectorstore(self) -> BaseVectorStore:
-        embeddings = EmbeddingsFactory.create_model(self.settings)
+        embeddings = EmbeddingsFactory.get_model(self.settings)
 
         vectorstore_cls = getattr(
             importlib.import_module("rag_3w_cot.vectorstores"),
@@ -41,18 +61,27 @@ class BaseProcessor(BaseModel):
         )
 
         vectorstore_path = self.get_vectorstore_cache_path(self.data_path)
+        if vectorstore_path.exists():
+            self.touch_cache(vectorstore_path)
 
         return vectorstore_cls(
             settings=self.settings, embeddings=embeddings, index_path=vectorstore_path
         )
 
+    @cached_property
+    def cache_manager(self) -> CacheManager:
+        return CacheManager(
+            cache_dir=self.data_path / ".cache",
+            max_size_bytes=self.cache_max_size_bytes,
+        )
+
     @cached_property
     def available_files(self) -> List[Path]:
-        return [
+        return sorted(
             file
             for file in self.data_path.glob("*")
             if file.suffix in self.settings.processing_allowed_extensions
-        ]
+        )
 
     @cached_property
     def df_metadata(self) -> pd.DataFrame:
@@ -67,47 +96,50 @@ class BaseProcessor(BaseModel):
             df[df["sha1"].isin(available_sha1)][["sha1", "company_name"]]
         )
 
+    @cached_property
+    def metadata_index(self) -> MetadataIndex:
+        return MetadataIndex.from_dataframe(self.df_metadata)
+
+    @cached_property
+    def stage_hashes(self) -> Dict[str, str]:
+        return self.settings.get_stage_hashes()
+
     @cached_property
     def vectorstore_cache_hash(self) -> str:
-        hash_components = (
-            self.settings.processing_vectorstore,
-            self.settings.processing_document_html_to_markdown,
-            self.settings.processing_decument_deduplicate,
-            self.settings.processing_document_filter_similar_documents_threshold,
-            self.settings.processing_document_filter_small_documents_chars,
-            self.settings.embeddings_model,
-            self.settings.embeddings_huggingface_precision,
-            self.settings.embeddings_huggingface_batch_size,
-        )
-        combined_string = "".join(str(component) for component in hash_components)
-        return hashlib.md5(combined_string.encode()).hexdigest()
+        return self.stage_hashes["index"]
 
     @cached_property
     def json_cache_hash(self) -> str:
-        hash_components = (
-            self.settings.llm_chunk_size,
-            self.settings.unstructured_strategy,
-            self.settings.unstructured_chunking_strategy,
-            self.settings.unstructured_multipage_sections,
-            self.settings.unstructured_overlap,
-        )
-        combined_string = "".join(str(component) for component in hash_components)
-        return hashlib.md5(combined_string.encode()).hexdigest()
+        return self.stage_hashes["parse"]
 
     def process(self, *args, **kwargs) -> Any:
-        return asyncio.run(self.async_process(*args, **kwargs))
+        try:
+            output = asyncio.run(self.async_process(*args, **kwargs))
+        finally:
+            # search threads are only needed while processing
+            if "vectorstore" in self.__dict__:
+                self.vectorstore.close()
+
+        self.cache_manager.evict(keep=self.cache_dirs)
+
+        return output
 
     async def async_process(self, *args, **kwargs):
         raise NotImplementedError()
 
+    def close(self):
+        vectorstore = self.__dict__.pop("vectorstore", None)
+        if vectorstore is not None:
+            vectorstore.close()
+
     def cache_path(self, path: Path, type_: str) -> Path:
         cache_dir = (path if path.is_dir() else path.parent) / ".cache"
         cache_hash = getattr(self, f"{type_}_cache_hash")
-        cache_path: Path = (
-            cache_dir / f".{type_}" / cache_hash / path.with_suffix(f".{type_}").name
-        )
-        cache_path.parent.mkdir(parents=True, exist_ok=True)
-        return cache_path
+        return cache_dir / f".{type_}" / cache_hash / path.with_suffix(f".{type_}").name
+
+    def touch_cache(self, cache_path: Path):
+        # only entries actually loaded or written count as used for eviction
+        CacheManager.touch(cache_path.parent)
 
     def get_vectorstore_cache_path(self, path: Path) -> Path:
         return self.cache_path(path, "vectorstore")
@@ -121,18 +153,11 @@ class BaseProcessor(BaseModel):
 
         logger.error(f"Cache is disabled, cleaning up {path}'s cache...")
 
-        for extension in ["faiss", "json"]:
-            cache_path = self.cache_path(path, extension)
+        for type_ in ["vectorstore", "json"]:
+            cache_path = self.cache_path(path, type_)
 
+            logger.debug(f"Removing {cache_path}")
             if cache_path.is_dir():
-                tasks = []
-                for f in cache_path.glob("*"):
-                    print(f"Removing {f}")
-                    tasks.append(asyncio.to_thread(f.unlink))  # Run unlink in a thread
-
-                await asyncio.gather(*tasks)  # Run deletions concurrently
-                await asyncio.to_thread(cache_path.rmdir)
-                print(f"Removing {cache_path}")
+                await asyncio.to_thread(shutil.rmtree, cache_path, ignore_errors=True)
             else:
-                print(f"Removing {cache_path}")
                 await asyncio.to_thread(cache_path.unlink, missing_ok=True)
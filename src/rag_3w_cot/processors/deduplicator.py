@@ -0,0 +1,122 @@
+import re
+import zlib
+from collections import defaultdict
+from functools import cached_property, lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+from rag_3w_cot.models import Document
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache
+def optimal_lsh_bands(
+    threshold: float,
+    num_perm: int,
+    false_positive_weight: float = 0.1,
+    false_negative_weight: float = 0.9,
+) -> Tuple[int, int]:
+    # (bands, rows) minimizing the weighted false positive & false negative areas
+    # of the LSH S-curve around the threshold (see: Mining of Massive Datasets,
+    # ch. 3); candidates are verified afterwards, so missed pairs cost more
+    grid, step = np.linspace(0.0, 1.0, 201, retstep=True)
+    below = grid < threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            probability = 1.0 - (1.0 - grid**rows) ** bands
+            false_positive = probability[below].sum() * step
+            false_negative = (1.0 - probability[~below]).sum() * step
+            error = (
+                false_positive_weight * false_positive
+                + false_negative_weight * false_negative
+            )
+            if error < best_error:
+                best, best_error = (bands, rows), error
+
+    return best
+
+
+class MinHashDeduplicator(BaseModel):
+    threshold: float
+    num_perm: int = 128
+    shingle_size: int = 3
+    seed: int = 1
+
+    _signatures: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _buckets: List[Dict[bytes, List[int]]] = PrivateAttr(default_factory=list)
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+    )
+
+    @cached_property
+    def permutations(self) -> Tuple[np.ndarray, np.ndarray]:
+        generator = np.random.RandomState(self.seed)
+        a = generator.randint(1, MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+        b = generator.randint(0, MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+        return a, b
+
+    @cached_property
+    def bands(self) -> Tuple[int, int]:
+        return optimal_lsh_bands(self.threshold, self.num_perm)
+
+    def shingles(self, text: str) -> np.ndarray:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(tokens)) or 1
+        shingles = {
+            " ".join(tokens[i : i + size])
+            for i in range(max(len(tokens) - size, 0) + 1)
+        }
+        return np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        a, b = self.permutations
+        hashes = self.shingles(text)
+        permuted = ((np.outer(hashes, a) + b) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=0)
+
+    def is_duplicate(self, text: str) -> bool:
+        bands, rows = self.bands
+        if not self._buckets:
+            self._buckets = [defaultdict(list) for _ in range(bands)]
+
+        signature = self.signature(text)
+        keys = [
+            signature[band * rows : (band + 1) * rows].tobytes()
+            for band in range(bands)
+        ]
+
+        candidates = {
+            index
+            for bucket, key in zip(self._buckets, keys)
+            for index in bucket.get(key, [])
+        }
+        if candidates:
+            candidate_signatures = np.stack([self._signatures[i] for i in candidates])
+            similarities = (candidate_signatures == signature).mean(axis=1)
+            if np.any(similarities > self.threshold):
+                return True
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, keys):
+            bucket[key].append(index)
+
+        return False
+
+    def filter(self, documents: List[Document]) -> List[Document]:
+        return [
+            document
+            for document in documents
+            if not self.is_duplicate(document.page_content)
+        ]
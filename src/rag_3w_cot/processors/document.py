@@ -2,8 +2,10 @@ import asyncio
 import itertools
 import json
 import re
+import time
+from functools import cached_property
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
 
 import aiohttp
 from loguru import logger
@@ -13,12 +15,13 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 from rag_3w_cot.models import Document
 from rag_3w_cot.utils import (
-    extract_most_common_year,
+    extract_most_common_years,
     force_gpu_cache_release,
     normalize_sentence,
 )
 
 from .base import BaseProcessor
+from .deduplicator import MinHashDeduplicator
 
 
 class DocumentProcessor(BaseProcessor):
@@ -63,6 +66,30 @@ class DocumentProcessor(BaseProcessor):
         return self.settings.processing_document_filter_similar_documents_threshold
 
     @property
+    def filter_similar_documents_method(self) -> str:
+        return self.settings.processing_document_filter_similar_documents_method
+
+    @property
+    def filter_similar_documents_scope(self) -> str:
+        return self.settings.processing_document_filter_similar_documents_scope
+
+    @property
+    def filter_similar_documents_num_perm(self) -> int:
+        return self.settings.processing_document_filter_similar_documents_num_perm
+
+    @property
+    def streaming(self) -> bool:
+        return self.settings.processing_document_streaming
+
+    @property
+    def streaming_batch_size(self) -> int:
+        return self.settings.processing_document_streaming_batch_size
+
+    @property
+    def streaming_queue_size(self) -> int:
+        return self.settings.processing_document_streaming_queue_size
+
+    @cached_property
     def _asyncio_semaphore(self) -> asyncio.Semaphore:
         return asyncio.Semaphore(self.settings.processing_max_concurrent_tasks)
 
@@ -72,34 +99,202 @@ class DocumentProcessor(BaseProcessor):
         vectorstore_path = self.get_vectorstore_cache_path(self.data_path)
         if self.enable_cache and vectorstore_path.exists():
             logger.warning(f"{self.data_path}: loading cached vectorstore...")
+            self.touch_cache(vectorstore_path)
             return
 
-        tasks = [self._process_single_document(file) for file in self.available_files]
+        # tfidf compares every pair of documents, too many across the corpus
+        if (
+            self.filter_similar_documents_threshold
+            and self.filter_similar_documents_scope == "corpus"
+            and self.filter_similar_documents_method != "minhash"
+        ):
+            raise ValueError(
+                f"Corpus similarity filtering requires minhash, got {self.filter_similar_documents_method}"
+            )
+
+        if self.streaming:
+            return await self._async_process_streaming()
+
+        loaded = await asyncio.gather(
+            *[self._load_elements(file) for file in self.available_files]
+        )
+        elements_per_file = [elements for elements, _ in loaded]
+        years = await self._extract_years(elements_per_file)
+
+        tasks = []
+        for file, (elements, cached), year in zip(self.available_files, loaded, years):
+            documents = await self._json_to_documents(elements, year=year)
+            if not cached:
+                await self._cache_documents(documents, file)
+            tasks.append(self._process_single_document(file, documents))
+
         documents = list(itertools.chain(*await asyncio.gather(*tasks)))
 
+        if (
+            self.filter_similar_documents_threshold
+            and self.filter_similar_documents_scope == "corpus"
+        ):
+            documents = await self._filter_similar_documents(documents)
+            logger.debug(
+                f"{self.data_path}: {len(documents)} document(s) after corpus similarity filtering"
+            )
+
         await self.cleanup_if_no_cache(self.data_path)
 
         logger.warning(f"{self.data_path}: (re)creating vectorestore...")
         self.vectorstore.create(documents)
+        self.touch_cache(vectorstore_path)
 
-    async def _process_single_document(self, file: Path) -> List[Document]:
-        async with self._asyncio_semaphore:
-            logger.warning(f"{file}: processing...")
+    async def _async_process_streaming(self):
+        await self.cleanup_if_no_cache(self.data_path)
 
-            if self.force_gpu_cache_release:
-                force_gpu_cache_release()
+        logger.warning(f"{self.data_path}: (re)creating vectorestore (streaming)...")
+
+        queue: asyncio.Queue[List[Document] | None] = asyncio.Queue(
+            maxsize=self.streaming_queue_size
+        )
+        deduplicator = (
+            MinHashDeduplicator(
+                threshold=self.filter_similar_documents_threshold,
+                num_perm=self.filter_similar_documents_num_perm,
+            )
+            if self.filter_similar_documents_threshold
+            and self.filter_similar_documents_scope == "corpus"
+            else None
+        )
+        stats = {
+            "producer_blocked_seconds": 0.0,
+            "consumer_idle_seconds": 0.0,
+            "indexing_seconds": 0.0,
+            "overlapped_indexing_seconds": 0.0,
+            "batches": 0,
+            "documents": 0,
+        }
+
+        async def produce(file: Path, turn: asyncio.Event, next_turn: asyncio.Event):
+            elements, cached = await self._load_elements(file)
+            (year,) = await self._extract_years([elements])
+            documents = await self._json_to_documents(elements, year=year)
+            if not cached:
+                await self._cache_documents(documents, file)
 
+            documents = await self._process_single_document(file, documents)
+
+            # files are queued in a fixed order, corpus minhash keeps the first seen
+            await turn.wait()
+            for i in range(0, len(documents), self.streaming_batch_size):
+                start = time.perf_counter()
+                await queue.put(documents[i : i + self.streaming_batch_size])
+                stats["producer_blocked_seconds"] += time.perf_counter() - start
+            next_turn.set()
+
+        async def work(files: Iterator[Tuple[Path, asyncio.Event, asyncio.Event]]):
+            for file, turn, next_turn in files:
+                await produce(file, turn, next_turn)
+
+        async def produce_all():
+            turns = [asyncio.Event() for _ in range(len(self.available_files) + 1)]
+            turns[0].set()
+            files = zip(self.available_files, turns, turns[1:])
+            try:
+                # at most max_concurrent_tasks files in flight
+                await asyncio.gather(
+                    *[work(files) for _ in range(self.max_concurrent_tasks)]
+                )
+            finally:
+                producing.clear()
+                await queue.put(None)
+
+        async def index(documents: List[Document]):
+            start = time.perf_counter()
+            await asyncio.to_thread(self.vectorstore.add_documents, documents)
+            elapsed = time.perf_counter() - start
+            stats["indexing_seconds"] += elapsed
+            if producing.is_set():
+                stats["overlapped_indexing_seconds"] += elapsed
+            stats["batches"] += 1
+            stats["documents"] += len(documents)
+
+        async def consume():
+            buffer: List[Document] = []
+            while True:
+                start = time.perf_counter()
+                documents = await queue.get()
+                stats["consumer_idle_seconds"] += time.perf_counter() - start
+                if documents is None:
+                    break
+
+                if deduplicator:
+                    documents = await asyncio.to_thread(deduplicator.filter, documents)
+
+                buffer.extend(documents)
+                while len(buffer) >= self.streaming_batch_size:
+                    await index(buffer[: self.streaming_batch_size])
+                    buffer = buffer[self.streaming_batch_size :]
+
+            if buffer:
+                await index(buffer)
+
+        producing = asyncio.Event()
+        producing.set()
+
+        start = time.perf_counter()
+        await asyncio.gather(produce_all(), consume())
+        await asyncio.to_thread(self.vectorstore.save)
+        self.touch_cache(self.get_vectorstore_cache_path(self.data_path))
+        stats["wall_seconds"] = time.perf_counter() - start
+
+        logger.success(f"{self.data_path}: streaming stats {json.dumps(stats)}")
+
+    async def _load_elements(self, file: Path) -> Tuple[List[dict], bool]:
+        async with self._asyncio_semaphore:
             await self.cleanup_if_no_cache(file)
 
             try:
                 if not self.enable_cache:
                     raise FileNotFoundError
-                documents = await self._load_cached_documents(file)
+                return await self._load_cached_elements(file), True
             except FileNotFoundError:
                 logger.warning(f"{file}: cache not found, calling Unstructured API...")
+                return await self._call_unstructured(file), False
 
-                documents = await self._call_unstructured(file)
-                await self._cache_documents(documents, file)
+    async def _extract_years(self, elements_per_file: List[List[dict]]) -> List[int]:
+        years = [self._get_cached_year(elements) for elements in elements_per_file]
+        missing = [i for i, year in enumerate(years) if year is None]
+
+        contents_per_file = []
+        for i in missing:
+            elements = elements_per_file[i]
+            content_key = (
+                "text" if elements and "text" in elements[0] else "page_content"
+            )
+            contents_per_file.append(
+                [str(item.get(content_key, "")) for item in elements]
+            )
+
+        extracted_years = await asyncio.to_thread(
+            extract_most_common_years, contents_per_file
+        )
+        for i, year in zip(missing, extracted_years):
+            years[i] = year
+
+        return [int(year) for year in years]  # pyright: ignore
+
+    def _get_cached_year(self, elements: List[dict]) -> Optional[int]:
+        years = {dict(item.get("metadata", {})).get("year") for item in elements}
+        if len(years) != 1 or None in years:
+            return None
+
+        return int(years.pop())  # pyright: ignore
+
+    async def _process_single_document(
+        self, file: Path, documents: List[Document]
+    ) -> List[Document]:
+        async with self._asyncio_semaphore:
+            logger.warning(f"{file}: processing...")
+
+            if self.force_gpu_cache_release:
+                force_gpu_cache_release()
 
             logger.debug(f"{file}: {len(documents)} document(s) found")
 
@@ -123,7 +318,10 @@ class DocumentProcessor(BaseProcessor):
                     f"{file}: {len(documents)} document(s) after size filtering"
                 )
 
-            if self.filter_similar_documents_threshold:
+            if (
+                self.filter_similar_documents_threshold
+                and self.filter_similar_documents_scope == "file"
+            ):
                 documents = await self._filter_similar_documents(documents)
                 logger.debug(
                     f"{file}: {len(documents)} document(s) after similarity filtering"
@@ -133,7 +331,7 @@ class DocumentProcessor(BaseProcessor):
 
         return documents
 
-    async def _call_unstructured(self, file: Path) -> List[Document]:
+    async def _call_unstructured(self, file: Path) -> List[dict]:
         payload = {
             "filename": file.name,
             "response_type": "application/json",
@@ -170,19 +368,16 @@ class DocumentProcessor(BaseProcessor):
                         f"Error processing file {file}: {await response.text()}"
                     )
 
-                response_json = await response.json()
+                return await response.json()
 
-        return await self._json_to_documents(response_json)
-
-    async def _json_to_documents(self, unstructured_data: List[dict]) -> List[Document]:
+    async def _json_to_documents(
+        self, unstructured_data: List[dict], year: Optional[int] = None
+    ) -> List[Document]:
         if not unstructured_data:
             return []
 
-        most_common_year = await asyncio.to_thread(
-            extract_most_common_year,
-            unstructured_data,
-            content_key="text" if "text" in unstructured_data[0] else "page_content",
-        )
+        if year is None:
+            (year,) = await self._extract_years([unstructured_data])
 
         documents = []
         for item in unstructured_data:
@@ -198,12 +393,7 @@ class DocumentProcessor(BaseProcessor):
                 "page_index", int(metadata.get("page_number", 0)) - 1
             )
 
-            try:
-                owner = self.df_metadata[self.df_metadata["sha1"] == sha1].iloc[0][
-                    "company_name"
-                ]
-            except IndexError:
-                owner = filename
+            owner = self.metadata_index.get_owner(sha1, default=filename)
 
             content_type = metadata.get("content_type", "text")
             if "text_as_html" in metadata:
@@ -217,7 +407,7 @@ class DocumentProcessor(BaseProcessor):
                     "pdf_sha1": str(sha1),
                     "page_index": int(page_index),
                     "owner": str(owner),
-                    "year": int(most_common_year),
+                    "year": int(year),
                     "content_type": content_type,
                 },
             )
@@ -249,6 +439,13 @@ class DocumentProcessor(BaseProcessor):
         ):
             return documents or []
 
+        if self.filter_similar_documents_method == "minhash":
+            deduplicator = MinHashDeduplicator(
+                threshold=self.filter_similar_documents_threshold,
+                num_perm=self.filter_similar_documents_num_perm,
+            )
+            return await asyncio.to_thread(deduplicator.filter, documents)
+
         vectorizer = TfidfVectorizer(stop_words="english")
         doc_texts = [doc.page_content for doc in documents]
         tfidf_matrix = await asyncio.to_thread(vectorizer.fit_transform, doc_texts)
@@ -304,11 +501,14 @@ class DocumentProcessor(BaseProcessor):
         dumped_documents = [d.model_dump() for d in documents]
         json_string = json.dumps(dumped_documents, indent=4)
 
+        self.touch_cache(output_file)
         await asyncio.to_thread(output_file.write_text, json_string)
 
-    async def _load_cached_documents(self, file: Path) -> List[Document]:
+    async def _load_cached_elements(self, file: Path) -> List[dict]:
         file = self.get_json_cache_path(file)
         if not file.exists():
             raise FileNotFoundError(f"Cache file {file} not found")
 
-        return await self._json_to_documents(json.loads(file.read_text()))
+        elements = json.loads(await asyncio.to_thread(file.read_text))
+        self.touch_cache(file)
+        return elements
@@ -0,0 +1,40 @@
+from typing import Dict, Iterable, List
+
+import pandas as pd
+from pydantic import BaseModel
+
+
+class MetadataIndex(BaseModel):
+    owner_by_sha1: Dict[str, str]
+    sha1_by_owner: Dict[str, List[str]]
+
+    @property
+    def owners(self) -> List[str]:
+        return list(self.sha1_by_owner)
+
+    @property
+    def sha1s(self) -> List[str]:
+        return list(self.owner_by_sha1)
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: pd.DataFrame,
+        sha1_column: str = "sha1",
+        owner_column: str = "company_name",
+    ) -> "MetadataIndex":
+        owner_by_sha1: Dict[str, str] = {}
+        sha1_by_owner: Dict[str, List[str]] = {}
+        for sha1, owner in zip(
+            df[sha1_column].astype(str).tolist(), df[owner_column].astype(str).tolist()
+        ):
+            owner_by_sha1.setdefault(sha1, owner)
+            sha1_by_owner.setdefault(owner, []).append(sha1)
+
+        return cls(owner_by_sha1=owner_by_sha1, sha1_by_owner=sha1_by_owner)
+
+    def get_owner(self, sha1: str, default: str) -> str:
+        return self.owner_by_sha1.get(sha1, default)
+
+    def get_sha1s(self, owners: Iterable[str]) -> List[str]:
+        return [sha1 for owner in owners for sha1 in self.sha1_by_owner.get(owner, [])]
@@ -1,14 +1,16 @@
 import asyncio
+import hashlib
 import importlib
-import itertools
+import json
+from functools import cached_property
 from pathlib import Path
-from typing import List, Set, Type
+from typing import List, Optional, Set, Tuple, Type
 
 from loguru import logger
 
 from rag_3w_cot.dictionaries import BaseTermsDictionary
 from rag_3w_cot.models import Document, Query
-from rag_3w_cot.utils import force_gpu_cache_release, get_cosine_similarity
+from rag_3w_cot.utils import force_gpu_cache_release, get_cosine_similarities
 
 from .base import BaseProcessor
 
@@ -42,6 +44,29 @@ class QueryProcessor(BaseProcessor):
     def html_to_markdown(self) -> bool:
         return self.settings.processing_document_html_to_markdown
 
+    @property
+    def enable_retrieval_cache(self) -> bool:
+        return (
+            self.enable_cache and self.settings.processing_query_enable_retrieval_cache
+        )
+
+    @property
+    def cache_types(self) -> List[str]:
+        return super().cache_types + ["retrieval"]
+
+    @cached_property
+    def retrieval_cache_hash(self) -> str:
+        hash_components = (
+            self.stage_hashes["retrieve"],
+            sorted(self.metadata_index.owner_by_sha1.items()),
+        )
+        combined_string = "".join(str(component) for component in hash_components)
+        return hashlib.md5(combined_string.encode()).hexdigest()
+
+    def get_retrieval_cache_path(self, query: Query) -> Path:
+        question_hash = hashlib.md5(query.question_text.encode()).hexdigest()
+        return self.cache_path(self.data_path / question_hash, "retrieval")
+
     @property
     def query_terms_dictionary(self) -> List[Type[BaseTermsDictionary]] | None:
         if not self.settings.processing_query_terms_dictionary:
@@ -60,43 +85,59 @@ class QueryProcessor(BaseProcessor):
     async def async_process(self, queries: List[Query]) -> List[Query]:
         logger.success(f"{len(queries)} queries found!")
 
-        tasks = [self._process_single_query(query) for query in queries]
-        queries = await asyncio.gather(*tasks)
+        if self.force_gpu_cache_release:
+            force_gpu_cache_release()
 
-        return queries
+        for query in queries:
+            logger.warning(f"{query.question_text}: processing...")
 
-    async def _process_single_query(self, query: Query) -> Query:
-        logger.warning(f"{query.question_text}: processing...")
+        cached = await asyncio.gather(
+            *[self._load_cached_retrieval(query) for query in queries]
+        )
+        for query, retrieval in zip(queries, cached):
+            if retrieval is not None:
+                self._get_question_expanded(query)
+                query.set_relevant_files(retrieval[0])
+                query.set_relevant_documents(retrieval[1])
+                logger.success(f"{query.question_text}: processed (cached)!")
+
+        queries_to_process = [
+            query for query, retrieval in zip(queries, cached) if retrieval is None
+        ]
 
-        if self.force_gpu_cache_release:
-            force_gpu_cache_release()
+        # the vector store (and its embeddings model) is only loaded on cache misses
+        if queries_to_process:
+            await self._process_queries(queries_to_process)
 
-        relevant_files = await self._get_relevant_files(query)
-        query.set_relevant_files(relevant_files)
+        return queries
 
-        relevant_documents = await self._get_relevant_documents(query, relevant_files)
-        query.set_relevant_documents(relevant_documents)
+    async def _process_queries(self, queries: List[Query]):
+        tasks = [self._get_relevant_files(query) for query in queries]
+        relevant_files = await asyncio.gather(*tasks)
+        for query, files in zip(queries, relevant_files):
+            query.set_relevant_files(files)
 
-        logger.success(f"{query.question_text}: processed!")
+        relevant_documents = await self._get_relevant_documents(queries, relevant_files)
+        for query, documents in zip(queries, relevant_documents):
+            query.set_relevant_documents(documents)
+            await self._cache_retrieval(query)
+            logger.success(f"{query.question_text}: processed!")
 
-        return query
+        logger.debug(
+            f"Vectorstore executor: {self.vectorstore.executor_stats.describe()}"
+        )
 
     async def _get_relevant_files(self, query: Query) -> Set[Path]:
-        available_owners = self.df_metadata["company_name"].tolist()
-        available_sha1 = self.df_metadata["sha1"].tolist()
+        available_owners = self.metadata_index.owners
+        available_sha1 = self.metadata_index.sha1s
 
         exact_matched_owners = {
             owner for owner in available_owners if owner in query.question_text
         }
 
-        async def _compute_similarity(query_text: str, owner: str) -> float:
-            return await asyncio.to_thread(get_cosine_similarity, query_text, owner)
-
-        similarity_tasks = [
-            _compute_similarity(query.question_text, owner)
-            for owner in available_owners
-        ]
-        similarity_scores = await asyncio.gather(*similarity_tasks)
+        similarity_scores = await asyncio.to_thread(
+            get_cosine_similarities, query.question_text, available_owners
+        )
         similarity_matached_owners = {
             owner
             for owner, score in zip(available_owners, similarity_scores)
@@ -104,9 +145,7 @@ class QueryProcessor(BaseProcessor):
         }
 
         matched_owners = exact_matched_owners | similarity_matached_owners
-        matched_sha1 = self.df_metadata[
-            self.df_metadata["company_name"].isin(list(matched_owners))
-        ]["sha1"].tolist()
+        matched_sha1 = self.metadata_index.get_sha1s(matched_owners)
 
         logger.debug(
             f"{query.question_text}: matched owners {matched_owners} & sha1 {matched_sha1}"
@@ -119,41 +158,83 @@ class QueryProcessor(BaseProcessor):
         return files
 
     async def _get_relevant_documents(
-        self, query: Query, files: Set[Path]
-    ) -> List[Document]:
-        documents = []
+        self, queries: List[Query], files_per_query: List[Set[Path]]
+    ) -> List[List[Document]]:
+        questions = [self._get_question_expanded(query) for query in queries]
+        pairs = [(i, file) for i, files in enumerate(files_per_query) for file in files]
+
+        # every (query, file) search of the batch in one vector store call
+        text_documents = await self.vectorstore.async_batch_search(
+            questions=[questions[i] for i, _ in pairs],
+            filters=[
+                {"pdf_sha1": file.stem, "content_type": "text"} for _, file in pairs
+            ],
+            type_=self.query_search_type,
+        )
 
-        question = self._get_question_expanded(query)
+        # tables are only searched in files with relevant text
+        type_pairs = [
+            pair for pair, documents in zip(pairs, text_documents) if documents
+        ]
+        type_documents = await self.vectorstore.async_batch_search(
+            questions=[questions[i] for i, _ in type_pairs],
+            filters=[
+                {
+                    "pdf_sha1": file.stem,
+                    "content_type": "markdown" if self.html_to_markdown else "html",
+                }
+                for _, file in type_pairs
+            ],
+            type_=self.query_search_type,
+        )
+        type_documents_per_pair = dict(zip(type_pairs, type_documents))
+
+        documents_per_query: List[List[Document]] = [[] for _ in queries]
+        for pair, documents in zip(pairs, text_documents):
+            if documents:
+                documents_per_query[pair[0]].extend(
+                    documents + type_documents_per_pair[pair]
+                )
 
-        tasks = [
-            self._get_relevant_documents_per_file(question, file) for file in files
+        return [
+            self.vectorstore.sort_by_score(documents)
+            for documents in documents_per_query
         ]
-        results = await asyncio.gather(*tasks)
-        documents = list(itertools.chain.from_iterable(results))
 
-        return self.vectorstore.sort_by_score(documents)
+    async def _load_cached_retrieval(
+        self, query: Query
+    ) -> Optional[Tuple[Set[Path], List[Document]]]:
+        if not self.enable_retrieval_cache:
+            return None
 
-    async def _get_relevant_documents_per_file(
-        self, question: str, file: Path
-    ) -> List[Document]:
-        text_relevant_documents = await self.vectorstore.async_search(
-            question=question,
-            filter={"pdf_sha1": file.stem, "content_type": "text"},
-            type_=self.query_search_type,
-        )
-        if not text_relevant_documents:
-            return []
-
-        type_relevant_documents = await self.vectorstore.async_search(
-            question=question,
-            filter={
-                "pdf_sha1": file.stem,
-                "content_type": "markdown" if self.html_to_markdown else "html",
-            },
-            type_=self.query_search_type,
+        cache_path = self.get_retrieval_cache_path(query)
+        if not cache_path.exists():
+            return None
+
+        retrieval = json.loads(await asyncio.to_thread(cache_path.read_text))
+        self.touch_cache(cache_path)
+        return (
+            {Path(file) for file in retrieval["relevant_files"]},
+            [
+                Document.model_validate(document)
+                for document in retrieval["relevant_documents"]
+            ],
         )
 
-        return text_relevant_documents + type_relevant_documents
+    async def _cache_retrieval(self, query: Query):
+        if not self.enable_retrieval_cache:
+            return
+
+        retrieval = {
+            "question_text": query.question_text,
+            "relevant_files": sorted(str(file) for file in query.get_relevant_files()),
+            "relevant_documents": [
+                document.model_dump() for document in query.get_relevant_documents()
+            ],
+        }
+        cache_path = self.get_retrieval_cache_path(query)
+        self.touch_cache(cache_path)
+        await asyncio.to_thread(cache_path.write_text, json.dumps(retrieval))
 
     def _get_question_expanded(self, query: Query) -> str:
         if self.query_terms_dictionary:
@@ -1,11 +1,111 @@
+import hashlib
 from pathlib import Path
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 import torch
 from loguru import logger
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# fields read by each stage, in hash order, each stage depending on the previous one
+STAGE_FIELDS: Dict[str, List[str]] = {
+    "parse": [
+        "llm_chunk_size",
+        "unstructured_strategy",
+        "unstructured_chunking_strategy",
+        "unstructured_multipage_sections",
+        "unstructured_overlap",
+    ],
+    "clean": [
+        "processing_document_html_to_markdown",
+        "processing_decument_deduplicate",
+        "processing_document_filter_similar_documents_threshold",
+        "processing_document_filter_similar_documents_method",
+        "processing_document_filter_similar_documents_scope",
+        "processing_document_filter_similar_documents_num_perm",
+        "processing_document_filter_small_documents_chars",
+        # corpus-scope minhash keeps different near-duplicates than batch processing
+        "processing_document_streaming",
+    ],
+    "index": [
+        "processing_allowed_extensions",
+        "processing_vectorstore",
+        "embeddings_model",
+        "embeddings_huggingface_precision",
+        "embeddings_huggingface_backend",
+        "embeddings_huggingface_onnx_quantization",
+        "vectorstore_index_type",
+        "vectorstore_train_sample_size",
+        "vectorstore_ivf_nlist",
+        "vectorstore_pq_m",
+        "vectorstore_pq_nbits",
+        "vectorstore_hnsw_m",
+        "vectorstore_hnsw_ef_construction",
+        "vectorstore_quantization",
+    ],
+    "retrieve": [
+        "processing_query_terms_dictionary",
+        "processing_use_normalized_query",
+        "processing_query_search_type",
+        "processing_query_hybrid_fusion",
+        "processing_query_similarity_file_score_threshold",
+        "processing_query_similarity_document_text_score_threshold",
+        "processing_query_similarity_document_text_lambda_mult",
+        "processing_query_similarity_document_text_top_k",
+        "processing_query_similarity_document_type_score_threshold",
+        "processing_query_similarity_document_type_lambda_mult",
+        "processing_query_similarity_document_type_top_k",
+        "vectorstore_ivf_nprobe",
+        "vectorstore_hnsw_ef_search",
+        "vectorstore_rerank_k_factor",
+    ],
+    "generate": [
+        "llm",
+        "llm_chunk_size",
+        "llm_batch_size",
+        "llm_temperature",
+        "llm_pipeline_top_p",
+        "llm_repetition_penalty",
+        "llm_padding",
+        "llm_num_beams",
+        "llm_early_stopping",
+        "llm_do_sample",
+        "llm_use_fast",
+        "llm_flash_attention_2",
+        "llm_quantization_type",
+    ],
+    "evaluate": [
+        "evaluation_retrieval_k",
+    ],
+}
+
+# performance, resources & credentials, which never change any stage's outputs
+RUNTIME_FIELDS: List[str] = [
+    "device",
+    "force_gpu_cache_release",
+    "embeddings_huggingface_batch_size",
+    "embeddings_huggingface_token_budget",
+    "embeddings_huggingface_onnx_threads",
+    "embeddings_huggingface_onnx_path",
+    "processing_enable_cache",
+    "processing_cache_max_size_gb",
+    "processing_max_concurrent_tasks",
+    "processing_query_enable_retrieval_cache",
+    "processing_document_streaming_batch_size",
+    "processing_document_streaming_queue_size",
+    "vectorstore_lazy_load",
+    "vectorstore_omp_threads",
+    "vectorstore_embedding_processes",
+    "evaluation_enable_cache",
+    "evaluation_max_concurrent_tasks",
+    "evaluation_cache_path",
+    "sweep_max_concurrent_tasks",
+    "unstructured_url",
+    "open_api_key",
+    "huggingface_api_key",
+    "unstructured_api_key",
+]
+
 
 class Settings(BaseSettings):
     device: str = "cuda" if torch.cuda.is_available() else "cpu"
@@ -40,8 +140,18 @@ class Settings(BaseSettings):
     ] = "BAAI/bge-large-en"
     embeddings_huggingface_precision: Literal["float32", "int8"] = "float32"
     embeddings_huggingface_batch_size: int = 4
+    embeddings_huggingface_token_budget: int | None = 2048
+    embeddings_huggingface_backend: Literal["torch", "onnx"] = "torch"
+    embeddings_huggingface_onnx_quantization: Literal[
+        "none", "arm64", "avx2", "avx512", "avx512_vnni"
+    ] = "none"
+    embeddings_huggingface_onnx_threads: int | None = None
+    embeddings_huggingface_onnx_path: Path = (
+        Path.home() / ".cache" / "rag_3w_cot" / "onnx"
+    )
 
     processing_enable_cache: bool = True
+    processing_cache_max_size_gb: float | None = None
     processing_max_concurrent_tasks: int = 4
     processing_allowed_extensions: List[str] = [".pdf"]
     processing_use_normalized_query: bool = False
@@ -52,6 +162,7 @@ class Settings(BaseSettings):
     processing_query_search_type: Literal["similarity_search", "mmr_search"] = (
         "mmr_search"
     )
+    processing_query_hybrid_fusion: Literal["rrf", "weighted"] = "rrf"
     processing_query_similarity_file_score_threshold: float = 0.5
     processing_query_similarity_document_text_score_threshold: float = 0.50
     processing_query_similarity_document_text_lambda_mult: float = 1.0
@@ -59,10 +170,43 @@ class Settings(BaseSettings):
     processing_query_similarity_document_type_score_threshold: float = 0.25
     processing_query_similarity_document_type_lambda_mult: float = 1.0
     processing_query_similarity_document_type_top_k: int = 10
+    processing_query_enable_retrieval_cache: bool = True
     processing_document_html_to_markdown: bool = True
     processing_decument_deduplicate: bool = True
     processing_document_filter_similar_documents_threshold: float | None = 0.95
+    processing_document_filter_similar_documents_method: Literal["tfidf", "minhash"] = (
+        "tfidf"
+    )
+    processing_document_filter_similar_documents_scope: Literal["file", "corpus"] = (
+        "file"
+    )
+    processing_document_filter_similar_documents_num_perm: int = 128
     processing_document_filter_small_documents_chars: int | None = 200
+    processing_document_streaming: bool = False
+    processing_document_streaming_batch_size: int = 256
+    processing_document_streaming_queue_size: int = 8
+
+    vectorstore_index_type: Literal["flat", "ivf_flat", "ivf_pq", "hnsw"] = "flat"
+    vectorstore_train_sample_size: int = 100_000
+    vectorstore_ivf_nlist: int = 1024
+    vectorstore_ivf_nprobe: int = 16
+    vectorstore_pq_m: int = 64
+    vectorstore_pq_nbits: int = 8
+    vectorstore_hnsw_m: int = 32
+    vectorstore_hnsw_ef_construction: int = 200
+    vectorstore_hnsw_ef_search: int = 64
+    vectorstore_quantization: Literal["none", "sq8", "pq"] = "none"
+    vectorstore_rerank_k_factor: int = 4
+    vectorstore_lazy_load: bool = True
+    vectorstore_omp_threads: int | None = None
+    vectorstore_embedding_processes: int = 1
+
+    evaluation_enable_cache: bool = True
+    evaluation_max_concurrent_tasks: int = 4
+    evaluation_retrieval_k: List[int] = [1, 5, 10, 20]
+    evaluation_cache_path: Path = Path.home() / ".cache" / "rag_3w_cot" / "evaluations"
+
+    sweep_max_concurrent_tasks: int = 2
 
     # see: https://github.com/Unstructured-IO/unstructured-api
     unstructured_url: str = "http://localhost:9500/general/v0/general"
@@ -90,3 +234,14 @@ class Settings(BaseSettings):
 
     def debug(self):
         logger.debug(self.dump_json())
+
+    def get_stage_hashes(self) -> Dict[str, str]:
+        stage_hashes: Dict[str, str] = {}
+        upstream_hash = ""
+        for stage, fields in STAGE_FIELDS.items():
+            hash_components = [upstream_hash] + [getattr(self, f) for f in fields]
+            combined_string = "".join(str(component) for component in hash_components)
+            upstream_hash = hashlib.md5(combined_string.encode()).hexdigest()
+            stage_hashes[stage] = upstream_hash
+
+        return stage_hashes
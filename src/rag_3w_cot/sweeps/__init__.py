@@ -0,0 +1,6 @@
+from .runner import SweepPoint, SweepRunner
+
+__all__ = [
+    "SweepPoint",
+    "SweepRunner",
+]
@@ -0,0 +1,247 @@
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+from rag_3w_cot.embeddings import EmbeddingsFactory
+from rag_3w_cot.evaluations import EvaluationRunner, RetrievalEvaluation
+from rag_3w_cot.models import Answer, Document, Query
+from rag_3w_cot.pipelines import CotPipeline
+from rag_3w_cot.processors import DocumentProcessor, QueryProcessor
+from rag_3w_cot.settings import Settings
+
+
+class SweepPoint(BaseModel):
+    params: Dict[str, Any]
+    settings: Settings
+    keys: Dict[str, str]
+
+
+class SweepRunner(BaseModel):
+    settings: Settings
+    grid: Dict[str, List[Any]]
+
+    data_path: Path
+    metadata_file: Path
+    output_path: Path
+    queries: List[Query]
+    true_answers: List[Answer] = []
+
+    @property
+    def max_concurrent_tasks(self) -> int:
+        return self.settings.sweep_max_concurrent_tasks
+
+    @property
+    def points(self) -> List[SweepPoint]:
+        unknown_fields = set(self.grid) - set(Settings.model_fields)
+        if unknown_fields:
+            raise ValueError(
+                f"Unknown settings in sweep grid: {sorted(unknown_fields)}"
+            )
+
+        points = []
+        for values in itertools.product(*self.grid.values()):
+            params = dict(zip(self.grid, values))
+            # evicted once after the sweep, a point would evict the previous ones
+            settings = self.settings.model_copy(
+                update={**params, "processing_cache_max_size_gb": None}
+            )
+            points.append(
+                SweepPoint(
+                    params=params,
+                    settings=settings,
+                    keys=settings.get_stage_hashes(),
+                )
+            )
+
+        return points
+
+    def get_stage_path(self, stage: str, key: str) -> Path:
+        return self.output_path / "stages" / stage / key
+
+    def run(self) -> List[dict]:
+        points = self.points
+        logger.warning(f"Running sweep over {len(points)} point(s)...")
+
+        # parse, clean and index are cached together by the document processor, runs
+        # sharing a parse key would race on its json cache & eviction
+        self.run_stage("index", points, self.run_index, max_workers=1)
+        self.run_stage("retrieve", points, self.run_retrieve)
+
+        # the LLM needs the GPU memory held by the embeddings model, one at a time
+        EmbeddingsFactory.unload()
+        self.run_stage("generate", points, self.run_generate, max_workers=1)
+        self.run_stage("evaluate", points, self.run_evaluate)
+        self.evict_cache(points)
+
+        results = []
+        for point in points:
+            scores_path = self.get_stage_path("evaluate", point.keys["evaluate"])
+            results.append(
+                {
+                    "params": point.params,
+                    "keys": point.keys,
+                    "scores": json.loads((scores_path / "scores.json").read_text()),
+                }
+            )
+
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        (self.output_path / "results.json").write_text(
+            json.dumps(results, default=str, indent=4)
+        )
+        return results
+
+    def run_stage(
+        self,
+        stage: str,
+        points: List[SweepPoint],
+        func: Callable[[SweepPoint, Path], None],
+        max_workers: Optional[int] = None,
+    ):
+        # one run per distinct stage key, grid points sharing it reuse the output
+        unique_points: Dict[str, SweepPoint] = {}
+        for point in points:
+            unique_points.setdefault(point.keys[stage], point)
+
+        pending = [
+            (point, self.get_stage_path(stage, key))
+            for key, point in unique_points.items()
+            if not self.is_cached(stage, point)
+        ]
+        logger.info(
+            f"Stage {stage}: {len(unique_points)} distinct run(s), {len(pending)} not cached"
+        )
+
+        def run(point: SweepPoint, stage_path: Path):
+            stage_path.mkdir(parents=True, exist_ok=True)
+            func(point, stage_path)
+            (stage_path / ".done").touch()
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or self.max_concurrent_tasks
+        ) as executor:
+            list(executor.map(lambda args: run(*args), pending))
+
+    def is_cached(self, stage: str, point: SweepPoint) -> bool:
+        if not (self.get_stage_path(stage, point.keys[stage]) / ".done").exists():
+            return False
+
+        # the index itself lives in the processors cache, evicted or disabled since
+        if stage == "index":
+            return (
+                self.get_document_processor(point)
+                .get_vectorstore_cache_path(self.data_path)
+                .exists()
+            )
+
+        return True
+
+    def evict_cache(self, points: List[SweepPoint]):
+        keep = [
+            cache_dir
+            for point in points
+            for cache_dir in self.get_query_processor(point).cache_dirs
+        ]
+        self.get_query_processor().cache_manager.evict(keep=keep)
+
+    def get_document_processor(self, point: SweepPoint) -> DocumentProcessor:
+        return DocumentProcessor(
+            settings=point.settings,
+            data_path=self.data_path,
+            metadata_file=self.metadata_file,
+        )
+
+    def get_query_processor(self, point: Optional[SweepPoint] = None) -> QueryProcessor:
+        return QueryProcessor(
+            settings=point.settings if point else self.settings,
+            data_path=self.data_path,
+            metadata_file=self.metadata_file,
+        )
+
+    def run_index(self, point: SweepPoint, stage_path: Path):
+        self.get_document_processor(point).process()
+
+    def run_retrieve(self, point: SweepPoint, stage_path: Path):
+        queries = [
+            Query(question_text=query.question_text, kind=query.kind)
+            for query in self.queries
+        ]
+        queries = self.get_query_processor(point).process(queries)
+        self.save_queries(queries, stage_path / "queries.json")
+
+    def run_generate(self, point: SweepPoint, stage_path: Path):
+        queries = self.load_queries(point)
+        answers = CotPipeline(
+            settings=point.settings, queries=queries, output_path=stage_path
+        ).run()
+        (stage_path / "answers.json").write_text(
+            json.dumps(
+                [answer.model_dump(by_alias=True) for answer in answers],
+                default=str,
+                indent=4,
+            )
+        )
+
+    def run_evaluate(self, point: SweepPoint, stage_path: Path):
+        scores = {}
+        if self.true_answers:
+            scores.update(
+                RetrievalEvaluation(
+                    settings=point.settings,
+                    queries=self.load_queries(point),
+                    true_answers=self.true_answers,
+                ).get_scores()
+            )
+            scores.update(
+                EvaluationRunner(
+                    settings=point.settings,
+                    answers=self.load_answers(point),
+                    true_answers=self.true_answers,
+                ).run()
+            )
+
+        (stage_path / "scores.json").write_text(json.dumps(scores, indent=4))
+
+    @staticmethod
+    def save_queries(queries: List[Query], file: Path):
+        file.write_text(
+            json.dumps(
+                [
+                    {
+                        "question_text": query.question_text,
+                        "kind": query.kind,
+                        "relevant_files": [str(f) for f in query.get_relevant_files()],
+                        "relevant_documents": [
+                            document.model_dump()
+                            for document in query.get_relevant_documents()
+                        ],
+                    }
+                    for query in queries
+                ],
+                indent=4,
+            )
+        )
+
+    def load_queries(self, point: SweepPoint) -> List[Query]:
+        file = self.get_stage_path("retrieve", point.keys["retrieve"]) / "queries.json"
+
+        queries = []
+        for data in json.loads(file.read_text()):
+            query = Query(question_text=data["question_text"], kind=data["kind"])
+            query.set_relevant_files({Path(f) for f in data["relevant_files"]})
+            query.set_relevant_documents(
+                [Document(**document) for document in data["relevant_documents"]]
+            )
+            queries.append(query)
+
+        return queries
+
+    def load_answers(self, point: SweepPoint) -> List[Answer]:
+        file = self.get_stage_path("generate", point.keys["generate"]) / "answers.json"
+        return [
+            Answer.model_validate(answer) for answer in json.loads(file.read_text())
+        ]
@@ -1,9 +1,10 @@
 import gc
 import re
 import string
+from collections import defaultdict
 from datetime import datetime
 from functools import lru_cache
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 import spacy
@@ -71,10 +72,16 @@ def get_cosine_similarity(text1: str, text2: str, stop_words: bool = True) -> fl
     return float(np.mean(cosine_similarity(query_vector, matrix)))
 
 
-def get_vector_cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
-    return float(
-        np.mean(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
-    )
+def get_cosine_similarities(
+    text: str, others: List[str], stop_words: bool = True
+) -> List[float]:
+    if not others:
+        return []
+
+    vectorizer = TfidfVectorizer(stop_words="english" if stop_words else None)
+    matrix = vectorizer.fit_transform([str(text).lower()])
+    others_matrix = vectorizer.transform([str(other).lower() for other in others])
+    return cosine_similarity(others_matrix, matrix)[:, 0].tolist()
 
 
 @lru_cache
@@ -82,6 +89,70 @@ def spacey_language_model():
     return spacy.load("en_core_web_sm")
 
 
+YEAR_PATTERN = re.compile(r"\b\d{4}\b")
+SPACY_YEAR_COMPONENTS = ("tok2vec", "ner")
+
+
+def extract_most_common_years(
+    contents_per_file: List[List[str]],
+    year_start: int = datetime.now().year - 10,
+    year_end: int = datetime.now().year - 1,
+    max_content_length: int = 250,
+    batch_size: int = 256,
+) -> List[int]:
+    years: List[int] = [-1] * len(contents_per_file)
+    ambiguous_contents: List[str] = []
+    ambiguous_files: List[int] = []
+
+    for i, contents in enumerate(contents_per_file):
+        candidate_contents = []
+        candidate_years = set()
+        for content in contents:
+            if not content or len(content) > max_content_length:
+                continue
+
+            matches = {
+                int(match)
+                for match in YEAR_PATTERN.findall(content)
+                if year_start <= int(match) <= year_end
+            }
+            if matches:
+                candidate_contents.append(content)
+                candidate_years |= matches
+
+        if len(candidate_years) == 1:
+            years[i] = candidate_years.pop()
+        elif candidate_years:
+            ambiguous_contents.extend(candidate_contents)
+            ambiguous_files.extend([i] * len(candidate_contents))
+
+    if not ambiguous_contents:
+        return years
+
+    nlp = spacey_language_model()
+    disabled_components = [
+        name for name in nlp.pipe_names if name not in SPACY_YEAR_COMPONENTS
+    ]
+
+    found_years: Dict[int, List[int]] = defaultdict(list)
+    docs = nlp.pipe(
+        ambiguous_contents, disable=disabled_components, batch_size=batch_size
+    )
+    for i, doc in zip(ambiguous_files, docs):
+        found_years[i].extend(
+            int(ent.text)
+            for ent in doc.ents
+            if ent.label_ == "DATE"
+            and ent.text.isdigit()
+            and year_start <= int(ent.text) <= year_end
+        )
+
+    for i, found in found_years.items():
+        years[i] = round(sum(found) / len(found)) if found else -1
+
+    return years
+
+
 def extract_most_common_year(
     documents: List[dict],
     content_key: str = "page_content",
@@ -89,22 +160,10 @@ def extract_most_common_year(
     year_end: int = datetime.now().year - 1,
 ) -> int:
     contents = [str(item.get(content_key, "")) for item in documents]
-    possible_header_footnotes = [
-        content for content in contents if content and len(content) <= 250
-    ]
-    merged_content = " ".join(possible_header_footnotes)
-
-    doc = spacey_language_model()(merged_content)
-
-    found_years = [
-        int(ent.text)
-        for ent in doc.ents
-        if ent.label_ == "DATE"
-        and ent.text.isdigit()
-        and year_start <= int(ent.text) <= year_end
-    ]
-
-    return round(sum(found_years) / len(found_years)) if found_years else -1
+    (year,) = extract_most_common_years(
+        [contents], year_start=year_start, year_end=year_end
+    )
+    return year
 
 
 def force_gpu_cache_release():
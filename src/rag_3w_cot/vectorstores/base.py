@@ -1,14 +1,41 @@
 import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from langchain_core.embeddings import Embeddings
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 from rag_3w_cot.models import Document
 from rag_3w_cot.settings import Settings
 from rag_3w_cot.utils import get_cosine_similarity
+from rag_3w_cot.vectorstores.metadata import match_metadata
+
+T = TypeVar("T")
+
+
+class ExecutorStats(BaseModel):
+    tasks: int = 0
+    queue_seconds: float = 0.0
+    max_queue_seconds: float = 0.0
+    run_seconds: float = 0.0
+
+    def record(self, queue_seconds: float, run_seconds: float):
+        self.tasks += 1
+        self.queue_seconds += queue_seconds
+        self.max_queue_seconds = max(self.max_queue_seconds, queue_seconds)
+        self.run_seconds += run_seconds
+
+    def describe(self) -> str:
+        mean_queue_seconds = self.queue_seconds / self.tasks if self.tasks else 0.0
+        return (
+            f"{self.tasks} task(s), queueing {mean_queue_seconds:.4f}s mean / "
+            f"{self.max_queue_seconds:.4f}s max, running {self.run_seconds:.2f}s"
+        )
 
 
 class BaseVectorStore(BaseModel):
@@ -16,6 +43,9 @@ class BaseVectorStore(BaseModel):
     embeddings: Embeddings
     index_path: Path
 
+    _executor_stats: ExecutorStats = PrivateAttr(default_factory=ExecutorStats)
+    _executor_stats_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
     )
@@ -52,21 +82,96 @@ class BaseVectorStore(BaseModel):
     def vectorstore(self) -> Any:
         raise NotImplementedError()
 
+    @cached_property
+    def executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=self.max_concurrent_tasks,
+            thread_name_prefix=type(self).__name__,
+            initializer=self.initialize_worker,
+        )
+
+    @property
+    def executor_stats(self) -> ExecutorStats:
+        with self._executor_stats_lock:
+            return self._executor_stats.model_copy()
+
+    def initialize_worker(self):
+        pass
+
+    def close(self):
+        # worker threads keep a reference to the initializer, so to the vector store
+        executor = self.__dict__.pop("executor", None)
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def run_in_executor(self, func: Callable[..., T], *args, **kwargs) -> T:
+        submitted = time.perf_counter()
+
+        def run() -> T:
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._executor_stats_lock:
+                    self._executor_stats.record(
+                        started - submitted, time.perf_counter() - started
+                    )
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
     def create(self, documents: List[Document]) -> Any:
         raise NotImplementedError()
 
+    def add_documents(self, documents: List[Document]) -> Any:
+        raise NotImplementedError()
+
+    def save(self) -> Any:
+        raise NotImplementedError()
+
     async def async_similarity_search(self, *args, **kwargs) -> List[Any]:
         raise NotImplementedError()
 
     async def async_mmr_search(self, *args, **kwargs) -> List[Any]:
         raise NotImplementedError()
 
-    async def async_search(
+    async def async_batch_similarity_search(
         self,
-        question: str,
-        filter: Optional[dict] = None,
-        type_: str = "similarity_search",
-    ) -> List[Document]:
+        questions: List[str],
+        top_k: int = 4,
+        score_threshold: float = 0.6,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[Any]]:
+        filters = filters or [None] * len(questions)
+        tasks = [
+            self.async_similarity_search(
+                question,
+                top_k=top_k,
+                score_threshold=score_threshold,
+                lambda_mult=lambda_mult,
+                filter=filter,
+            )
+            for question, filter in zip(questions, filters)
+        ]
+        return await asyncio.gather(*tasks)
+
+    async def async_batch_mmr_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[Any]]:
+        filters = filters or [None] * len(questions)
+        tasks = [
+            self.async_mmr_search(
+                question, top_k=top_k, lambda_mult=lambda_mult, filter=filter
+            )
+            for question, filter in zip(questions, filters)
+        ]
+        return await asyncio.gather(*tasks)
+
+    def get_search_kwargs(self, filter: Optional[dict]) -> Tuple[int, float, float]:
         content_type = "text" if not filter or "type" not in filter else filter["type"]
         content_type = "type" if content_type != "text" else "text"
 
@@ -74,34 +179,63 @@ class BaseVectorStore(BaseModel):
         score_threshold = getattr(self, f"document_{content_type}_score_threshold")
         lambda_mult = getattr(self, f"document_{content_type}_lambda_mult")
 
-        vectorstore_documents = []
-        match type_:
-            case "similarity_search":
-                vectorstore_documents = await self.async_similarity_search(
-                    question,
-                    top_k=top_k,
-                    score_threshold=score_threshold,
-                    lambda_mult=lambda_mult,
-                    filter=filter,
-                )
-            case "mmr_search":
-                vectorstore_documents = await self.async_mmr_search(
-                    question,
-                    top_k=top_k,
-                    lambda_mult=lambda_mult,
-                    filter=filter,
-                )
-            case _:
-                raise ValueError(f"Unknown search type: {type_}")
-
-        documents = self.from_vectorstore_documents(vectorstore_documents)
-        documents = self.deduplicate(documents)
-        documents = self.filter_documents(documents, filter)
-        documents = self.add_scores(question, documents)
-        documents = self.sort_by_score(documents)
+        return top_k, score_threshold, lambda_mult
 
+    async def async_search(
+        self,
+        question: str,
+        filter: Optional[dict] = None,
+        type_: str = "similarity_search",
+    ) -> List[Document]:
+        (documents,) = await self.async_batch_search([question], [filter], type_)
         return documents
 
+    async def async_batch_search(
+        self,
+        questions: List[str],
+        filters: Optional[List[Optional[dict]]] = None,
+        type_: str = "similarity_search",
+    ) -> List[List[Document]]:
+        filters = filters or [None] * len(questions)
+
+        groups: Dict[Tuple[int, float, float], List[int]] = defaultdict(list)
+        for i, filter in enumerate(filters):
+            groups[self.get_search_kwargs(filter)].append(i)
+
+        vectorstore_documents: List[List[Any]] = [[] for _ in questions]
+        for (top_k, score_threshold, lambda_mult), indices in groups.items():
+            group_questions = [questions[i] for i in indices]
+            group_filters = [filters[i] for i in indices]
+
+            match type_:
+                case "similarity_search":
+                    results = await self.async_batch_similarity_search(
+                        group_questions,
+                        top_k=top_k,
+                        score_threshold=score_threshold,
+                        lambda_mult=lambda_mult,
+                        filters=group_filters,
+                    )
+                case "mmr_search":
+                    results = await self.async_batch_mmr_search(
+                        group_questions,
+                        top_k=top_k,
+                        lambda_mult=lambda_mult,
+                        filters=group_filters,
+                    )
+                case _:
+                    raise ValueError(f"Unknown search type: {type_}")
+
+            for i, result in zip(indices, results):
+                vectorstore_documents[i] = result
+
+        return [
+            self._process_search_results(question, documents, filter)
+            for question, documents, filter in zip(
+                questions, vectorstore_documents, filters
+            )
+        ]
+
     def similarity_search(self, *args, **kwargs) -> List[Any]:
         return asyncio.run(self.async_similarity_search(*args, **kwargs))
 
@@ -118,6 +252,16 @@ class BaseVectorStore(BaseModel):
             self.async_search(question=question, filter=filter, type_=type_)
         )
 
+    def batch_search(
+        self,
+        questions: List[str],
+        filters: Optional[List[Optional[dict]]] = None,
+        type_: str = "similarity_search",
+    ) -> List[List[Document]]:
+        return asyncio.run(
+            self.async_batch_search(questions=questions, filters=filters, type_=type_)
+        )
+
     def deduplicate(self, documents: List[Document]) -> List[Document]:
         deduplicated_documents = {}
         for document in documents:
@@ -154,16 +298,23 @@ class BaseVectorStore(BaseModel):
     def filter_documents(
         self, documents: List[Document], filter: Optional[dict]
     ) -> List[Document]:
-        filtered_documents = []
-        for document in documents:
-            filter_match = (
-                True
-                if not filter
-                else all(
-                    document.metadata.get(key) == value for key, value in filter.items()
-                )
-            )
-            if filter_match:
-                filtered_documents.append(document)
+        if not filter or not documents:
+            return documents
+
+        # few search results, the columnar index only pays off on the whole docstore
+        return [
+            document
+            for document in documents
+            if match_metadata(document.metadata, filter)
+        ]
+
+    def _process_search_results(
+        self, question: str, vectorstore_documents: List[Any], filter: Optional[dict]
+    ) -> List[Document]:
+        documents = self.from_vectorstore_documents(vectorstore_documents)
+        documents = self.deduplicate(documents)
+        documents = self.filter_documents(documents, filter)
+        documents = self.add_scores(question, documents)
+        documents = self.sort_by_score(documents)
 
-        return filtered_documents
+        return documents
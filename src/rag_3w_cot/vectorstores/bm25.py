@@ -0,0 +1,154 @@
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class BM25Index(BaseModel):
+    vocabulary: Dict[str, int]
+    indptr: np.ndarray
+    doc_ids: np.ndarray
+    weights: np.ndarray
+    num_documents: int
+    k1: float = 1.5
+    b: float = 0.75
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+    )
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return TOKEN_PATTERN.findall(text.lower())
+
+    @classmethod
+    def from_texts(
+        cls, texts: List[str], k1: float = 1.5, b: float = 0.75
+    ) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        term_ids, doc_ids, term_frequencies = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = cls.tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, frequency in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_frequencies.append(frequency)
+
+        term_ids_array = np.asarray(term_ids, dtype=np.int64)
+        doc_ids_array = np.asarray(doc_ids, dtype=np.int32)
+        frequencies = np.asarray(term_frequencies, dtype=np.float32)
+
+        # postings sorted by term (CSR rows), doc ids ascending within each term
+        order = np.argsort(term_ids_array, kind="stable")
+        term_ids_array = term_ids_array[order]
+        doc_ids_array = doc_ids_array[order]
+        frequencies = frequencies[order]
+
+        document_frequencies = np.bincount(term_ids_array, minlength=len(vocabulary))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequencies, out=indptr[1:])
+
+        num_documents = len(texts)
+        idf = np.log1p(
+            (num_documents - document_frequencies + 0.5) / (document_frequencies + 0.5)
+        ).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if num_documents else 0.0
+        length_norm = 1.0 - b + b * doc_lengths / (average_length or 1.0)
+
+        weights = (
+            idf[term_ids_array]
+            * frequencies
+            * (k1 + 1.0)
+            / (frequencies + k1 * length_norm[doc_ids_array])
+        ).astype(np.float32)
+
+        return cls(
+            vocabulary=vocabulary,
+            indptr=indptr,
+            doc_ids=doc_ids_array,
+            weights=weights,
+            num_documents=num_documents,
+            k1=k1,
+            b=b,
+        )
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "BM25Index":
+        mmap_mode = "r" if mmap else None
+        params = json.loads((path / "params.json").read_text())
+        return cls(
+            vocabulary=json.loads((path / "vocabulary.json").read_text()),
+            indptr=np.load(path / "indptr.npy", mmap_mode=mmap_mode),
+            doc_ids=np.load(path / "doc_ids.npy", mmap_mode=mmap_mode),
+            weights=np.load(path / "weights.npy", mmap_mode=mmap_mode),
+            **params,
+        )
+
+    def save(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "indptr.npy", self.indptr)
+        np.save(path / "doc_ids.npy", self.doc_ids)
+        np.save(path / "weights.npy", self.weights)
+        (path / "vocabulary.json").write_text(json.dumps(self.vocabulary))
+        (path / "params.json").write_text(
+            json.dumps(
+                {"num_documents": self.num_documents, "k1": self.k1, "b": self.b}
+            )
+        )
+
+    def get_scores(self, question: str) -> np.ndarray:
+        term_counts = Counter(
+            self.vocabulary[token]
+            for token in self.tokenize(question)
+            if token in self.vocabulary
+        )
+        if not term_counts:
+            return np.zeros(self.num_documents, dtype=np.float32)
+
+        postings = [
+            (self.indptr[term_id], self.indptr[term_id + 1], count)
+            for term_id, count in term_counts.items()
+        ]
+        positions = np.concatenate(
+            [np.arange(start, end) for start, end, _ in postings]
+        )
+        counts = np.concatenate(
+            [
+                np.full(end - start, count, dtype=np.float32)
+                for start, end, count in postings
+            ]
+        )
+
+        return np.bincount(
+            self.doc_ids[positions],
+            weights=self.weights[positions] * counts,
+            minlength=self.num_documents,
+        ).astype(np.float32)
+
+    def search(
+        self, question: str, k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        scores = self.get_scores(question)
+        candidates = scores > 0.0
+        if mask is not None:
+            candidates &= mask
+
+        candidate_ids = np.flatnonzero(candidates)
+        if len(candidate_ids) > k:
+            top = np.argpartition(-scores[candidate_ids], k - 1)[:k]
+            candidate_ids = candidate_ids[top]
+
+        candidate_ids = candidate_ids[np.argsort(-scores[candidate_ids], kind="stable")]
+        return candidate_ids, scores[candidate_ids]
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document as LangChainDocument
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+
+class SQLiteColumnMapping(Mapping):
+    def __init__(self, docstore: "SQLiteDocstore", key: str, value: str):
+        self.docstore = docstore
+        self.key = key
+        self.value = value
+
+    def __getitem__(self, key: Any) -> Any:
+        # faiss returns numpy integers, which sqlite cannot bind
+        if self.key == "row":
+            key = int(key)
+
+        value = self.docstore.get_value(self.value, self.key, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.docstore.iter_column(self.key)
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+
+class SQLiteDocstore(BaseModel, Docstore):
+    path: Path
+
+    _connection: Optional[sqlite3.Connection] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+    )
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # read-only, so several processes can share the same file
+            self._connection = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+
+        return self._connection
+
+    @property
+    def index_to_docstore_id(self) -> Mapping:
+        return SQLiteColumnMapping(self, key="row", value="id")
+
+    @property
+    def docstore_id_to_row(self) -> Mapping:
+        return SQLiteColumnMapping(self, key="id", value="row")
+
+    @classmethod
+    def write(
+        cls, path: Path, rows: Iterable[Tuple[int, str, LangChainDocument]]
+    ) -> "SQLiteDocstore":
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.unlink(missing_ok=True)
+
+        with sqlite3.connect(tmp_path) as connection:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(
+                "CREATE TABLE documents ("
+                "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+                "page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            connection.executemany(
+                "INSERT INTO documents VALUES (?, ?, ?, ?)",
+                (
+                    (row, id, document.page_content, json.dumps(document.metadata))
+                    for row, id, document in rows
+                ),
+            )
+        connection.close()
+
+        tmp_path.replace(path)
+        return cls(path=path)
+
+    def __len__(self) -> int:
+        return self._fetchone("SELECT COUNT(*) FROM documents")[0]
+
+    def get_value(self, column: str, key_column: str, key: Any) -> Any:
+        row = self._fetchone(
+            f"SELECT {column} FROM documents WHERE {key_column} = ?", (key,)
+        )
+        return row[0] if row else None
+
+    def iter_column(self, column: str) -> Iterator[Any]:
+        rows = self._fetchall(f"SELECT {column} FROM documents ORDER BY row")
+        return (row[0] for row in rows)
+
+    def search(self, search: str) -> Union[str, LangChainDocument]:
+        row = self._fetchone(
+            "SELECT id, page_content, metadata FROM documents WHERE id = ?", (search,)
+        )
+        if row is None:
+            return f"ID {search} not found."
+
+        id, page_content, metadata = row
+        return LangChainDocument(
+            id=id, page_content=page_content, metadata=json.loads(metadata)
+        )
+
+    def _fetchone(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        with self._lock:
+            return self.connection.execute(query, params).fetchone()
+
+    def _fetchall(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self.connection.execute(query, params).fetchall()
@@ -1,61 +1,96 @@
-import pickle
 from functools import cached_property
 from typing import List, Optional, Tuple
 from uuid import uuid4
 
-from langchain.retrievers import EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document as LangChainDocument
 from loguru import logger
+from pydantic import PrivateAttr
 
 from rag_3w_cot.models import Document
 from rag_3w_cot.vectorstores.base import BaseVectorStore
+from rag_3w_cot.vectorstores.bm25 import BM25Index
 from rag_3w_cot.vectorstores.faiss import FAISSVectorStore
 
 
 class EnsembleFAISSBM25VectorStore(BaseVectorStore):
     weights: List[float] = [0.75, 0.25]
+    rank_constant: int = 60
 
-    @cached_property
-    def vectorstore(self) -> Tuple[FAISS, BM25Retriever]:
-        bm25_retriever_path = self.index_path / "bm25_retriever.pkl"
-
-        if not bm25_retriever_path.exists():
-            raise FileNotFoundError(
-                f"Cached BM25 retriever not found: {self.index_path}"
-            )
+    _documents: List[Document] = PrivateAttr(default_factory=list)
 
-        logger.debug(
-            f"Loading FAISS vectorstore & BM25 retriever from {self.index_path}..."
-        )
+    @property
+    def fusion(self) -> str:
+        return self.settings.processing_query_hybrid_fusion
 
-        with open(bm25_retriever_path, "rb") as f:
-            bm25_retriever = pickle.load(f)
+    @property
+    def bm25_index_path(self):
+        return self.index_path / "bm25"
 
-        vectorstore = FAISSVectorStore(
+    @cached_property
+    def faiss_vectorstore(self) -> FAISSVectorStore:
+        return FAISSVectorStore(
             settings=self.settings,
             embeddings=self.embeddings,
             index_path=self.index_path,
-        ).vectorstore
+        )
 
-        return vectorstore, bm25_retriever
+    @cached_property
+    def vectorstore(self) -> Tuple[FAISS, BM25Index]:
+        vectorstore = self.faiss_vectorstore.vectorstore
 
-    def create(self, documents: List[Document]) -> Tuple[FAISS, BM25Retriever]:
-        vectorstore = FAISSVectorStore(
-            settings=self.settings,
-            embeddings=self.embeddings,
-            index_path=self.index_path,
-        ).create(documents)
-        langchain_documents = self.to_vectorstore_documents(documents)
+        if not (self.bm25_index_path / "params.json").exists():
+            logger.warning(
+                f"Cached BM25 index not found, rebuilding it from {self.index_path}..."
+            )
+            documents = [
+                vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+                for i in range(vectorstore.index.ntotal)
+            ]
+            bm25_index = BM25Index.from_texts(
+                [document.page_content for document in documents]  # pyright: ignore
+            )
+            bm25_index.save(self.bm25_index_path)
 
-        bm25_retriever = BM25Retriever.from_documents(langchain_documents)
-        bm25_retriever_path = self.index_path / "bm25_retriever.pkl"
+        logger.debug(f"Loading BM25 index from {self.bm25_index_path}...")
 
-        with open(bm25_retriever_path, "wb") as f:
-            pickle.dump(bm25_retriever, f)
+        return vectorstore, BM25Index.load(self.bm25_index_path)
 
-        return vectorstore, bm25_retriever
+    def initialize_worker(self):
+        self.faiss_vectorstore.initialize_worker()
+
+    def close(self):
+        super().close()
+        if "faiss_vectorstore" in self.__dict__:
+            self.faiss_vectorstore.close()
+
+    def create(self, documents: List[Document]) -> Tuple[FAISS, BM25Index]:
+        # FAISS rows follow the documents order, sharded across processes or not
+        vectorstore = self.faiss_vectorstore.create(documents)
+
+        bm25_index = BM25Index.from_texts(
+            [document.page_content for document in documents]
+        )
+        bm25_index.save(self.bm25_index_path)
+
+        return vectorstore, bm25_index
+
+    def add_documents(self, documents: List[Document]) -> FAISS:
+        self._documents.extend(documents)
+        return self.faiss_vectorstore.add_documents(documents)
+
+    def save(self) -> Tuple[FAISS, BM25Index]:
+        vectorstore = self.faiss_vectorstore.save()
+
+        # BM25 positions follow the FAISS rows, both built in insertion order
+        bm25_index = BM25Index.from_texts(
+            [document.page_content for document in self._documents]
+        )
+        bm25_index.save(self.bm25_index_path)
+        self._documents = []
+
+        return vectorstore, bm25_index
 
     async def async_similarity_search(
         self,
@@ -67,13 +102,30 @@ class EnsembleFAISSBM25VectorStore(BaseVectorStore):
     ) -> List[LangChainDocument]:
         return await self._async_search_helper(
             question=question,
-            search_type="similarity_score_threshold",
+            search_type="similarity",
             k=top_k,
             score_threshold=score_threshold,
             lambda_mult=lambda_mult,
             filter=filter,
         )
 
+    async def async_batch_similarity_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        score_threshold: float = 0.6,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[LangChainDocument]]:
+        return await self._async_batch_search_helper(
+            questions=questions,
+            search_type="similarity",
+            filters=filters,
+            k=top_k,
+            score_threshold=score_threshold,
+            lambda_mult=lambda_mult,
+        )
+
     async def async_mmr_search(
         self,
         question: str,
@@ -89,6 +141,113 @@ class EnsembleFAISSBM25VectorStore(BaseVectorStore):
             filter=filter,
         )
 
+    async def async_batch_mmr_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[LangChainDocument]]:
+        return await self._async_batch_search_helper(
+            questions=questions,
+            search_type="mmr",
+            filters=filters,
+            k=top_k,
+            lambda_mult=lambda_mult,
+        )
+
+    def hybrid_search(
+        self,
+        questions: List[str],
+        k: int = 4,
+        filters: Optional[List[Optional[dict]]] = None,
+        search_type: str = "similarity",
+        score_threshold: Optional[float] = None,
+        lambda_mult: float = 0.5,
+        fetch_k: int = 20,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        _, bm25_index = self.vectorstore
+        filters = filters or [None] * len(questions)
+        masks = [self.faiss_vectorstore.get_filter_mask(filter) for filter in filters]
+        vectors = self.faiss_vectorstore.embed_questions(questions)
+
+        match search_type:
+            case "similarity":
+                dense = self.faiss_vectorstore.similarity_search_vectors(
+                    vectors, k, filters, score_threshold
+                )
+            case "mmr":
+                dense = [
+                    (rows, self.faiss_vectorstore.get_relevance_scores(distances))
+                    for rows, distances in self.faiss_vectorstore.mmr_search_vectors(
+                        vectors, k, filters, fetch_k, lambda_mult
+                    )
+                ]
+            case _:
+                raise ValueError(f"Unknown search type: {search_type}")
+
+        sparse = [
+            bm25_index.search(question, k=k, mask=mask)
+            for question, mask in zip(questions, masks)
+        ]
+
+        return self._fuse(dense, sparse)
+
+    def _fuse(
+        self,
+        dense: List[Tuple[np.ndarray, np.ndarray]],
+        sparse: List[Tuple[np.ndarray, np.ndarray]],
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        rankings = [(ranking, self.weights[0]) for ranking in dense] + [
+            (ranking, self.weights[1]) for ranking in sparse
+        ]
+        num_queries = len(dense)
+        lengths = np.asarray([len(rows) for (rows, _), _ in rankings], dtype=np.int64)
+        if not lengths.sum():
+            return [(np.empty(0, dtype=np.int64), np.empty(0))] * num_queries
+
+        query_ids = np.repeat(np.tile(np.arange(num_queries), 2), lengths)
+        rows = np.concatenate([rows for (rows, _), _ in rankings]).astype(np.int64)
+        weights = np.repeat([weight for _, weight in rankings], lengths)
+
+        match self.fusion:
+            case "rrf":
+                offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+                ranks = np.arange(len(rows)) - offsets + 1
+                contributions = weights / (ranks + self.rank_constant)
+            case "weighted":
+                contributions = weights * np.concatenate(
+                    [self._min_max_normalize(scores) for (_, scores), _ in rankings]
+                )
+            case _:
+                raise ValueError(f"Unknown fusion: {self.fusion}")
+
+        # one (query, row) key space for the whole batch, summed with a bincount
+        num_rows = int(rows.max()) + 1
+        keys, inverse = np.unique(query_ids * num_rows + rows, return_inverse=True)
+        fused_scores = np.bincount(inverse, weights=contributions)
+        fused_queries, fused_rows = np.divmod(keys, num_rows)
+
+        order = np.lexsort((-fused_scores, fused_queries))
+        fused_queries = fused_queries[order]
+        bounds = np.searchsorted(fused_queries, np.arange(num_queries + 1))
+
+        return [
+            (fused_rows[order][start:end], fused_scores[order][start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+    @staticmethod
+    def _min_max_normalize(scores: np.ndarray) -> np.ndarray:
+        if not len(scores):
+            return scores.astype(np.float64)
+
+        low, high = float(scores.min()), float(scores.max())
+        if high == low:
+            return np.ones(len(scores))
+
+        return (scores - low) / (high - low)
+
     def from_vectorstore_documents(
         self, other_documents: List[LangChainDocument]
     ) -> List[Document]:
@@ -114,17 +273,30 @@ class EnsembleFAISSBM25VectorStore(BaseVectorStore):
         ]
 
     async def _async_search_helper(
-        self, question: str, search_type: str, **kwargs
+        self, question: str, search_type: str, filter: Optional[dict] = None, **kwargs
     ) -> List[LangChainDocument]:
-        vectorstore, bm25_retriever = self.vectorstore
-
-        faiss_retriever = vectorstore.as_retriever(
-            search_type=search_type, search_kwargs=kwargs
+        (documents,) = await self._async_batch_search_helper(
+            [question], search_type, [filter], **kwargs
         )
+        return documents
 
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[faiss_retriever, bm25_retriever],
-            weights=self.weights,
-        )
+    async def _async_batch_search_helper(
+        self,
+        questions: List[str],
+        search_type: str,
+        filters: Optional[List[Optional[dict]]] = None,
+        **kwargs,
+    ) -> List[List[LangChainDocument]]:
+        if not questions:
+            return []
 
-        return await ensemble_retriever.ainvoke(question, verbose=False)
+        results = await self.run_in_executor(
+            self.hybrid_search,
+            questions,
+            k=kwargs.get("k", 4),
+            filters=filters,
+            search_type=search_type,
+            score_threshold=kwargs.get("score_threshold"),
+            lambda_mult=kwargs.get("lambda_mult", 0.5),
+        )
+        return [self.faiss_vectorstore.get_documents(rows) for rows, _ in results]
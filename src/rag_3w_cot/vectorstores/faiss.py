@@ -1,18 +1,116 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from functools import cached_property
-from typing import List, Optional
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import uuid4
 
 import faiss
+import numpy as np
 import torch
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS, DistanceStrategy
 from langchain_core.documents import Document as LangChainDocument
 from loguru import logger
+from pydantic import PrivateAttr
 
+from rag_3w_cot.embeddings import EmbeddingsFactory
 from rag_3w_cot.models import Document
+from rag_3w_cot.settings import Settings
 from rag_3w_cot.vectorstores import BaseVectorStore
+from rag_3w_cot.vectorstores.docstore import SQLiteDocstore
+from rag_3w_cot.vectorstores.indexes import (
+    RerankIndex,
+    create_index,
+    get_search_parameters,
+    is_quantized,
+    read_index,
+    set_search_parameters,
+    train_index,
+)
+from rag_3w_cot.vectorstores.metadata import MetadataColumns
+from rag_3w_cot.vectorstores.mmr import maximal_marginal_relevance
+
+
+def create_shard(settings: Settings, index_path: Path, documents: List[Document]):
+    # runs in a spawned process, with its own embeddings model
+    FAISSVectorStore(
+        settings=settings,
+        embeddings=EmbeddingsFactory.get_model(settings),
+        index_path=index_path,
+    ).create(documents)
+
+    return index_path
 
 
 class FAISSVectorStore(BaseVectorStore):
+    _building: Optional[FAISS] = PrivateAttr(default=None)
+    _pending: List[Tuple[List[Document], np.ndarray]] = PrivateAttr(
+        default_factory=list
+    )
+    _vectors: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _metadatas: List[dict] = PrivateAttr(default_factory=list)
+
+    @property
+    def index_type(self) -> str:
+        return self.settings.vectorstore_index_type
+
+    @property
+    def train_sample_size(self) -> int:
+        return self.settings.vectorstore_train_sample_size
+
+    @property
+    def ivf_nprobe(self) -> int:
+        return self.settings.vectorstore_ivf_nprobe
+
+    @property
+    def hnsw_ef_search(self) -> int:
+        return self.settings.vectorstore_hnsw_ef_search
+
+    @property
+    def quantization(self) -> str:
+        return self.settings.vectorstore_quantization
+
+    @property
+    def rerank_k_factor(self) -> int:
+        return self.settings.vectorstore_rerank_k_factor
+
+    @property
+    def is_quantized(self) -> bool:
+        return is_quantized(self.index_type, self.quantization)
+
+    @property
+    def omp_threads(self) -> int:
+        return self.settings.vectorstore_omp_threads or max(
+            1, (os.cpu_count() or 1) // self.max_concurrent_tasks
+        )
+
+    @property
+    def lazy_load(self) -> bool:
+        return self.settings.vectorstore_lazy_load
+
+    @property
+    def embedding_processes(self) -> int:
+        return self.settings.vectorstore_embedding_processes
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.index_path / "vectors.f32"
+
+    @property
+    def docstore_path(self) -> Path:
+        return self.index_path / "docstore.sqlite"
+
+    @property
+    def metadata_path(self) -> Path:
+        return self.index_path / "metadata"
+
     @cached_property
     def vectorstore(self) -> FAISS:
         if not self.index_path.exists():
@@ -20,34 +118,424 @@ class FAISSVectorStore(BaseVectorStore):
                 f"Cached FAISS vectorstore not found: {self.index_path}"
             )
 
-        logger.debug(f"Loading FAISS vectorstore from {self.index_path}...")
+        # caches created before the sqlite docstore are fully loaded
+        if self.lazy_load and self.docstore_path.exists():
+            logger.debug(f"Memory-mapping FAISS vectorstore from {self.index_path}...")
 
-        vectorstore = FAISS.load_local(
-            str(self.index_path),
-            embeddings=self.embeddings,
-            allow_dangerous_deserialization=True,
-        )
+            docstore = SQLiteDocstore(path=self.docstore_path)
+            vectorstore = FAISS(
+                self.embeddings,
+                read_index(self.index_path / "index.faiss", mmap=True),
+                docstore,
+                docstore.index_to_docstore_id,  # pyright: ignore
+            )
+        else:
+            logger.debug(f"Loading FAISS vectorstore from {self.index_path}...")
+
+            vectorstore = FAISS.load_local(
+                str(self.index_path),
+                embeddings=self.embeddings,
+                allow_dangerous_deserialization=True,
+            )
+            vectorstore.index = faiss.index_gpu_to_cpu(vectorstore.index)
+
+        set_search_parameters(vectorstore.index, self.ivf_nprobe, self.hnsw_ef_search)
+
+        # quantized codes stay in memory, the original vectors only for re-ranking
+        if self.is_quantized and self.rerank_k_factor > 0:
+            if self.vectors_path.exists():
+                vectorstore.index = RerankIndex.load(  # pyright: ignore
+                    vectorstore.index, self.vectors_path, self.rerank_k_factor
+                )
+            else:
+                logger.warning(
+                    f"Original vectors not found, searching without re-ranking: {self.vectors_path}"
+                )
 
-        vectorstore.index = faiss.index_gpu_to_cpu(vectorstore.index)
         return vectorstore
 
+    @cached_property
+    def metadata_columns(self) -> MetadataColumns:
+        if not (self.metadata_path / "columns.json").exists():
+            logger.warning(
+                f"Cached metadata columns not found, rebuilding them from {self.index_path}..."
+            )
+            documents = self.get_documents(range(self.vectorstore.index.ntotal))
+            MetadataColumns.from_metadatas(
+                [document.metadata for document in documents]
+            ).save(self.metadata_path)
+
+        return MetadataColumns.load(self.metadata_path)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         faiss.omp_set_num_threads(self.max_concurrent_tasks)
 
+    def initialize_worker(self):
+        # OpenMP threads are per calling thread, bounding workers x threads
+        faiss.omp_set_num_threads(self.omp_threads)
+
     def create(self, documents: List[Document]) -> FAISS:
-        langchain_documents = self.to_vectorstore_documents(documents)
+        if self.embedding_processes > 1 and len(documents) > self.embedding_processes:
+            return self.create_sharded(documents)
 
-        with torch.no_grad():
-            vectorstore = FAISS.from_documents(
-                langchain_documents,
-                embedding=self.embeddings,
-                distance_strategy=DistanceStrategy.COSINE,
+        self.add_documents(documents)
+        return self.save()
+
+    def create_sharded(self, documents: List[Document]) -> FAISS:
+        shard_size = -(-len(documents) // self.embedding_processes)
+        shards = [
+            documents[i : i + shard_size] for i in range(0, len(documents), shard_size)
+        ]
+
+        # built next to the index and moved into place once merged, so a crashed
+        # build never leaves a half-written index looking like a cached one
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        build_path = Path(
+            tempfile.mkdtemp(
+                prefix=f".{self.index_path.name}.", dir=self.index_path.parent
             )
+        )
+        shard_paths = [build_path / "shards" / str(i) for i in range(len(shards))]
+
+        # flat partial indexes on CPU, trained indexes are built once after merging
+        threads = max(1, (os.cpu_count() or 1) // len(shards))
+        shard_settings = self.settings.model_copy(
+            update={
+                "device": "cpu",
+                "vectorstore_index_type": "flat",
+                "vectorstore_quantization": "none",
+                "vectorstore_embedding_processes": 1,
+                "embeddings_huggingface_onnx_threads": (
+                    self.settings.embeddings_huggingface_onnx_threads or threads
+                ),
+            }
+        )
+
+        logger.info(
+            f"Embedding {len(documents)} document(s) in {len(shards)} process(es)..."
+        )
+        try:
+            with ProcessPoolExecutor(
+                max_workers=len(shards),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=torch.set_num_threads,
+                initargs=(threads,),
+            ) as executor:
+                shard_paths = list(
+                    executor.map(
+                        create_shard, repeat(shard_settings), shard_paths, shards
+                    )
+                )
 
+            merged_store = FAISSVectorStore(
+                settings=self.settings,
+                embeddings=self.embeddings,
+                index_path=build_path / "index",
+            )
+            vectorstore = merged_store.merge_shards(shard_paths)
+
+            shutil.rmtree(self.index_path, ignore_errors=True)
+            os.replace(merged_store.index_path, self.index_path)
+        finally:
+            shutil.rmtree(build_path, ignore_errors=True)
+
+        return vectorstore
+
+    def merge_shards(self, shard_paths: List[Path]) -> FAISS:
+        shards = [
+            FAISS.load_local(
+                str(shard_path),
+                embeddings=self.embeddings,
+                allow_dangerous_deserialization=True,
+            )
+            for shard_path in shard_paths
+        ]
+
+        # merged in shard order, so rows are the same as in a single process build
+        merged = shards[0]
+        for shard in shards[1:]:
+            merged.merge_from(shard)
+
+        documents = []
+        for row in range(merged.index.ntotal):
+            docstore_id = merged.index_to_docstore_id[row]
+            document = merged.docstore.search(docstore_id)
+            documents.append(
+                Document(
+                    id=docstore_id,
+                    page_content=document.page_content,  # pyright: ignore
+                    metadata=document.metadata,  # pyright: ignore
+                )
+            )
+
+        self._pending.append(
+            (documents, merged.index.reconstruct_n(0, merged.index.ntotal))
+        )
+        return self.save()
+
+    def add_documents(self, documents: List[Document]) -> Optional[FAISS]:
+        if not documents:
+            return self._building
+
+        self._pending.append((documents, self.embed_documents(documents)))
+
+        # trained indexes (approximate or quantized) wait for a sample to train on
+        pending_size = sum(len(vectors) for _, vectors in self._pending)
+        if (
+            (self.index_type == "flat" and not self.is_quantized)
+            or self._building is not None
+            or pending_size >= self.train_sample_size
+        ):
+            self._flush_pending()
+
+        return self._building
+
+    def save(self) -> FAISS:
+        self._flush_pending()
+
+        if self._building is None:
+            raise ValueError(
+                f"No documents added to FAISS vectorstore: {self.index_path}"
+            )
+
+        vectorstore, self._building = self._building, None
         vectorstore.save_local(str(self.index_path))
+        SQLiteDocstore.write(
+            self.docstore_path,
+            (
+                (row, docstore_id, vectorstore.docstore.search(docstore_id))  # pyright: ignore
+                for row, docstore_id in vectorstore.index_to_docstore_id.items()
+            ),
+        )
+
+        MetadataColumns.from_metadatas(self._metadatas).save(self.metadata_path)
+        self._metadatas = []
+
+        if self._vectors:
+            with self.vectors_path.open("wb") as f:
+                for vectors in self._vectors:
+                    vectors.tofile(f)
+            self._vectors = []
+
         return vectorstore
 
+    def create_index(self, vectors: np.ndarray) -> faiss.Index:
+        index = create_index(
+            vectors.shape[1],
+            self.index_type,
+            num_train=min(len(vectors), self.train_sample_size),
+            nlist=self.settings.vectorstore_ivf_nlist,
+            pq_m=self.settings.vectorstore_pq_m,
+            pq_nbits=self.settings.vectorstore_pq_nbits,
+            hnsw_m=self.settings.vectorstore_hnsw_m,
+            hnsw_ef_construction=self.settings.vectorstore_hnsw_ef_construction,
+            quantization=self.quantization,
+        )
+
+        if not index.is_trained:
+            logger.debug(
+                f"Training {type(index).__name__} on {min(len(vectors), self.train_sample_size)} vector(s)..."
+            )
+        train_index(index, vectors, self.train_sample_size)
+        set_search_parameters(index, self.ivf_nprobe, self.hnsw_ef_search)
+
+        return index
+
+    def embed_documents(self, documents: List[Document]) -> np.ndarray:
+        with torch.no_grad():
+            embeddings = self.embeddings.embed_documents(
+                [document.page_content for document in documents]
+            )
+
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+
+        documents = [document for batch, _ in self._pending for document in batch]
+        vectors = np.concatenate([vectors for _, vectors in self._pending])
+        self._pending = []
+
+        if self._building is None:
+            self._building = FAISS(
+                embedding_function=self.embeddings,
+                index=self.create_index(vectors),
+                docstore=InMemoryDocstore(),
+                index_to_docstore_id={},
+                distance_strategy=DistanceStrategy.COSINE,
+            )
+
+        if self.is_quantized:
+            self._vectors.append(vectors)
+        self._metadatas.extend(document.metadata for document in documents)
+
+        self._building.add_embeddings(
+            zip([document.page_content for document in documents], vectors),
+            metadatas=[document.metadata for document in documents],
+            ids=[document.id for document in documents],
+        )
+
+    def embed_questions(self, questions: List[str]) -> np.ndarray:
+        # the same question is usually searched against several files
+        unique_questions = list(dict.fromkeys(questions))
+        with torch.no_grad():
+            embeddings = self.embeddings.embed_documents(unique_questions)
+
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(
+            len(unique_questions), -1
+        )
+        positions = {question: i for i, question in enumerate(unique_questions)}
+        return vectors[[positions[question] for question in questions]]
+
+    def get_search_parameters(
+        self, mask: Optional[np.ndarray] = None
+    ) -> Optional[faiss.SearchParameters]:
+        return get_search_parameters(
+            self.vectorstore.index, mask, self.ivf_nprobe, self.hnsw_ef_search
+        )
+
+    def search_vectors(
+        self, vectors: np.ndarray, k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if mask is not None and not mask.any():
+            empty = np.empty((len(vectors), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        distances, rows = self.vectorstore.index.search(
+            vectors, k, params=self.get_search_parameters(mask)
+        )
+        return distances, rows
+
+    def get_relevance_scores(self, distances: np.ndarray) -> np.ndarray:
+        # same relevance scores as the LangChain retriever on the loaded store
+        relevance_score_fn = self.vectorstore._select_relevance_score_fn()
+        return np.vectorize(relevance_score_fn, otypes=[np.float32])(distances)
+
+    def similarity_search_vectors(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        filters: List[Optional[dict]],
+        score_threshold: Optional[float] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        results: List[Tuple[np.ndarray, np.ndarray]] = [
+            (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        ] * len(vectors)
+        for filter, indices in self.get_filter_groups(filters):
+            distances, rows = self.search_vectors(
+                vectors[indices], k, self.get_filter_mask(filter)
+            )
+            scores = self.get_relevance_scores(distances)
+            for i, query_rows, query_scores in zip(indices, rows, scores):
+                keep = query_rows >= 0
+                if score_threshold is not None:
+                    keep &= query_scores >= score_threshold
+                results[i] = (query_rows[keep], query_scores[keep])
+
+        return results
+
+    def batch_similarity_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        score_threshold: float = 0.6,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[LangChainDocument]]:
+        if not questions:
+            return []
+
+        results = self.similarity_search_vectors(
+            self.embed_questions(questions),
+            top_k,
+            filters or [None] * len(questions),
+            score_threshold,
+        )
+        return [self.get_documents(rows) for rows, _ in results]
+
+    def get_vectors(self, rows: np.ndarray) -> np.ndarray:
+        vectors = self.vectorstore.index.reconstruct_batch(rows.ravel())
+        return np.asarray(vectors, dtype=np.float32).reshape(*rows.shape, -1)
+
+    def mmr_search_vectors(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        filters: List[Optional[dict]],
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        results: List[Tuple[np.ndarray, np.ndarray]] = [
+            (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        ] * len(vectors)
+        for filter, indices in self.get_filter_groups(filters):
+            distances, rows = self.search_vectors(
+                vectors[indices], max(k, fetch_k), self.get_filter_mask(filter)
+            )
+            if not rows.size:
+                continue
+
+            valid = rows >= 0
+            selection = maximal_marginal_relevance(
+                vectors[indices],
+                self.get_vectors(np.where(valid, rows, 0)),
+                valid,
+                k,
+                lambda_mult,
+            )
+            for i, query_selection, query_rows, query_distances in zip(
+                indices, selection, rows, distances
+            ):
+                query_selection = query_selection[query_selection >= 0]
+                results[i] = (
+                    query_rows[query_selection],
+                    query_distances[query_selection],
+                )
+
+        return results
+
+    def batch_mmr_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+        fetch_k: int = 20,
+    ) -> List[List[LangChainDocument]]:
+        if not questions:
+            return []
+
+        results = self.mmr_search_vectors(
+            self.embed_questions(questions),
+            top_k,
+            filters or [None] * len(questions),
+            fetch_k,
+            lambda_mult,
+        )
+        return [self.get_documents(rows) for rows, _ in results]
+
+    def get_filter_mask(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        return self.metadata_columns.get_mask(filter)
+
+    @staticmethod
+    def get_filter_groups(
+        filters: List[Optional[dict]],
+    ) -> List[Tuple[Optional[dict], List[int]]]:
+        groups: Dict[str, List[int]] = defaultdict(list)
+        for i, filter in enumerate(filters):
+            groups[json.dumps(filter, sort_keys=True)].append(i)
+
+        return [(filters[indices[0]], indices) for indices in groups.values()]
+
+    def get_documents(self, rows: Iterable[int]) -> List[LangChainDocument]:
+        return [
+            self.vectorstore.docstore.search(  # pyright: ignore
+                self.vectorstore.index_to_docstore_id[int(row)]
+            )
+            for row in rows
+        ]
+
     async def async_similarity_search(
         self,
         question: str,
@@ -65,6 +553,37 @@ class FAISSVectorStore(BaseVectorStore):
             filter=filter,
         )
 
+    async def async_batch_similarity_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        score_threshold: float = 0.6,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[LangChainDocument]]:
+        return await self.run_in_executor(
+            self.batch_similarity_search,
+            questions,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            filters=filters,
+        )
+
+    async def async_batch_mmr_search(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        lambda_mult: float = 0.0,
+        filters: Optional[List[Optional[dict]]] = None,
+    ) -> List[List[LangChainDocument]]:
+        return await self.run_in_executor(
+            self.batch_mmr_search,
+            questions,
+            top_k=top_k,
+            lambda_mult=lambda_mult,
+            filters=filters,
+        )
+
     async def async_mmr_search(
         self,
         question: str,
@@ -110,4 +629,4 @@ class FAISSVectorStore(BaseVectorStore):
         retriever = self.vectorstore.as_retriever(
             search_type=search_type, search_kwargs=kwargs
         )
-        return await retriever.ainvoke(question, verbose=False)
+        return await self.run_in_executor(retriever.invoke, question, verbose=False)
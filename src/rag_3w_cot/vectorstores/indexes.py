@@ -0,0 +1,244 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+from loguru import logger
+from pydantic import BaseModel, ConfigDict
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+QUANTIZATIONS = ("none", "sq8", "pq")
+
+# faiss warns below 39 training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def get_ivf_nlist(nlist: int, num_train: int) -> int:
+    return max(1, min(nlist, num_train // MIN_POINTS_PER_CENTROID))
+
+
+def get_pq_nbits(pq_nbits: int, num_train: int) -> int:
+    # each PQ sub-quantizer is k-means over 2**nbits centroids
+    nbits = min(pq_nbits, max(num_train, 1).bit_length() - 1)
+    if nbits < 1:
+        raise ValueError(f"PQ needs at least 2 training vectors, got {num_train}")
+
+    return nbits
+
+
+def get_storage_factory_key(
+    quantization: str, pq_m: int = 64, pq_nbits: int = 8
+) -> str:
+    match quantization:
+        case "none":
+            return "Flat"
+        case "sq8":
+            return "SQ8"
+        case "pq":
+            return f"PQ{pq_m}x{pq_nbits}"
+        case _:
+            raise ValueError(f"Unknown quantization: {quantization}")
+
+
+def get_index_factory_key(
+    index_type: str,
+    num_train: int,
+    nlist: int = 1024,
+    pq_m: int = 64,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    quantization: str = "none",
+) -> str:
+    if quantization == "pq" or index_type == "ivf_pq":
+        pq_nbits = get_pq_nbits(pq_nbits, num_train)
+
+    storage = get_storage_factory_key(quantization, pq_m, pq_nbits)
+    match index_type:
+        case "flat" if quantization == "pq":
+            # a single inverted list scans all PQ codes but, unlike IndexPQ,
+            # supports id selectors for filtered searches
+            return f"IVF1,{storage}"
+        case "flat":
+            return storage
+        case "ivf_flat":
+            return f"IVF{get_ivf_nlist(nlist, num_train)},{storage}"
+        case "ivf_pq":
+            return f"IVF{get_ivf_nlist(nlist, num_train)},PQ{pq_m}x{pq_nbits}"
+        case "hnsw":
+            # faiss only supports 8 bits PQ codes under HNSW
+            if quantization == "pq" and num_train < 2**8:
+                raise ValueError(
+                    f"HNSW PQ needs at least {2**8} training vectors, got {num_train}"
+                )
+            storage = f"PQ{pq_m}x8" if quantization == "pq" else storage
+            return f"HNSW{hnsw_m},{storage}"
+        case _:
+            raise ValueError(f"Unknown index type: {index_type}")
+
+
+def is_quantized(index_type: str, quantization: str) -> bool:
+    return index_type == "ivf_pq" or quantization != "none"
+
+
+def get_ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def create_index(
+    dimension: int,
+    index_type: str,
+    num_train: int,
+    nlist: int = 1024,
+    pq_m: int = 64,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    hnsw_ef_construction: int = 200,
+    quantization: str = "none",
+) -> faiss.Index:
+    key = get_index_factory_key(
+        index_type, num_train, nlist, pq_m, pq_nbits, hnsw_m, quantization
+    )
+    index = faiss.index_factory(dimension, key, faiss.METRIC_L2)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = hnsw_ef_construction
+
+    # LangChain's MMR reconstructs the fetched vectors by id
+    ivf = get_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+
+    return index
+
+
+def train_index(
+    index: faiss.Index, vectors: np.ndarray, sample_size: int, seed: int = 0
+):
+    if index.is_trained:
+        return
+
+    if len(vectors) > sample_size:
+        sample = np.random.default_rng(seed).choice(
+            len(vectors), sample_size, replace=False
+        )
+        vectors = vectors[np.sort(sample)]
+
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def get_base_index(index) -> faiss.Index:
+    return index.base_index if isinstance(index, RerankIndex) else index
+
+
+def read_index(path: Path, mmap: bool = True) -> faiss.Index:
+    if mmap:
+        try:
+            # codes stay in the page cache, shared by every process reading them
+            return faiss.read_index(
+                str(path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+            )
+        except RuntimeError as e:
+            logger.warning(f"Cannot memory-map {path}, reading it instead: {e}")
+
+    return faiss.read_index(str(path))
+
+
+def set_search_parameters(index: faiss.Index, nprobe: int, ef_search: int):
+    index = get_base_index(index)
+    ivf = get_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = max(1, min(nprobe, ivf.nlist))
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def get_search_parameters(
+    index: faiss.Index,
+    mask: Optional[np.ndarray] = None,
+    nprobe: int = 16,
+    ef_search: int = 64,
+) -> Optional[faiss.SearchParameters]:
+    if mask is None:
+        return None
+
+    index = get_base_index(index)
+    selector = faiss.IDSelectorBitmap(np.packbits(mask, bitorder="little"))
+
+    if get_ivf(index) is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+
+    return faiss.SearchParameters(sel=selector)
+
+
+class RerankIndex(BaseModel):
+    base_index: faiss.Index
+    vectors: np.ndarray
+    k_factor: int = 4
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+    )
+
+    @property
+    def d(self) -> int:
+        return self.base_index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.base_index.ntotal
+
+    @property
+    def is_trained(self) -> bool:
+        return self.base_index.is_trained
+
+    @classmethod
+    def load(
+        cls, base_index: faiss.Index, vectors_path: Path, k_factor: int = 4
+    ) -> "RerankIndex":
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode="r")
+        return cls(
+            base_index=base_index,
+            vectors=vectors.reshape(-1, base_index.d),
+            k_factor=k_factor,
+        )
+
+    def reconstruct(self, key: int) -> np.ndarray:
+        return np.asarray(self.vectors[key])
+
+    def reconstruct_batch(self, keys: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[keys])
+
+    def search(
+        self,
+        x: np.ndarray,
+        k: int,
+        params: Optional[faiss.SearchParameters] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        fetch_k = min(max(k, k * self.k_factor), self.ntotal)
+        _, candidates = self.base_index.search(x, fetch_k, params=params)
+
+        # exact squared L2 on the (disk backed) original vectors of the candidates
+        found = candidates >= 0
+        diffs = self.vectors[np.where(found, candidates, 0)] - x[:, None, :]
+        distances = np.einsum("ijk,ijk->ij", diffs, diffs)
+        distances[~found] = np.inf
+
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(distances, order, axis=1)
+        rows = np.take_along_axis(candidates, order, axis=1)
+
+        # same padding as faiss when fewer than k results are found
+        padding = ((0, 0), (0, k - rows.shape[1]))
+        distances = np.pad(distances, padding, constant_values=np.inf)
+        rows = np.pad(rows, padding, constant_values=-1)
+        rows[np.isinf(distances)] = -1
+        distances[rows < 0] = np.finfo(np.float32).max
+
+        return distances.astype(np.float32), rows
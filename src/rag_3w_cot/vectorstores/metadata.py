@@ -0,0 +1,230 @@
+import json
+from numbers import Number
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, ConfigDict
+
+# same operators as LangChain's FAISS metadata filters
+OPERATORS = ("$eq", "$neq", "$gt", "$gte", "$lt", "$lte", "$in", "$nin")
+
+
+def compare_value(value: Any, operator: str, target: Any) -> bool:
+    match operator:
+        case "$eq":
+            return value == target
+        case "$neq":
+            return value != target
+        case "$in":
+            return value in target
+        case "$nin":
+            return value not in target
+        case "$gt" | "$gte" | "$lt" | "$lte" if value is None:
+            return False
+        case "$gt":
+            return value > target
+        case "$gte":
+            return value >= target
+        case "$lt":
+            return value < target
+        case "$lte":
+            return value <= target
+        case _:
+            raise ValueError(f"Unknown filter operator: {operator}")
+
+
+def match_metadata(metadata: dict, filter: dict) -> bool:
+    # strict comparisons, MetadataColumns compares categories as strings
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if not all(
+                compare_value(value, operator, target)
+                for operator, target in condition.items()
+            ):
+                return False
+        elif isinstance(condition, (list, tuple, set)):
+            if value not in condition:
+                return False
+        elif value != condition:
+            return False
+
+    return True
+
+
+class MetadataColumns(BaseModel):
+    num_rows: int
+    categories: Dict[str, List[str]] = {}
+    codes: Dict[str, np.ndarray] = {}
+    values: Dict[str, np.ndarray] = {}
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+    )
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self.codes) + list(self.values)
+
+    @staticmethod
+    def is_numeric(column: List[Any]) -> bool:
+        present = [value for value in column if value is not None]
+        return bool(present) and all(
+            isinstance(value, Number) and not isinstance(value, bool)
+            for value in present
+        )
+
+    @classmethod
+    def from_metadatas(cls, metadatas: List[dict]) -> "MetadataColumns":
+        categories, codes, values = {}, {}, {}
+        for key in dict.fromkeys(key for metadata in metadatas for key in metadata):
+            column = [metadata.get(key) for metadata in metadatas]
+
+            if cls.is_numeric(column):
+                values[key] = np.asarray(
+                    [np.nan if value is None else value for value in column],
+                    dtype=np.float64,
+                )
+                continue
+
+            # sorted categories, so code order is string order (range filters)
+            key_codes, key_categories = pd.factorize(
+                pd.Series(
+                    [None if value is None else str(value) for value in column],
+                    dtype=object,
+                ),
+                sort=True,
+            )
+            categories[key] = [str(category) for category in key_categories]
+            codes[key] = key_codes.astype(np.int32)
+
+        return cls(
+            num_rows=len(metadatas), categories=categories, codes=codes, values=values
+        )
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "MetadataColumns":
+        mmap_mode = "r" if mmap else None
+        columns = json.loads((path / "columns.json").read_text())
+        return cls(
+            num_rows=columns["num_rows"],
+            categories=columns["categories"],
+            codes={
+                key: np.load(path / f"codes_{i}.npy", mmap_mode=mmap_mode)
+                for i, key in enumerate(columns["categories"])
+            },
+            values={
+                key: np.load(path / f"values_{i}.npy", mmap_mode=mmap_mode)
+                for i, key in enumerate(columns["values"])
+            },
+        )
+
+    def save(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        for i, key in enumerate(self.categories):
+            np.save(path / f"codes_{i}.npy", self.codes[key])
+        for i, key in enumerate(self.values):
+            np.save(path / f"values_{i}.npy", self.values[key])
+        (path / "columns.json").write_text(
+            json.dumps(
+                {
+                    "num_rows": self.num_rows,
+                    "categories": self.categories,
+                    "values": list(self.values),
+                }
+            )
+        )
+
+    def get_mask(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+
+        mask = np.ones(self.num_rows, dtype=bool)
+        for key, condition in filter.items():
+            if isinstance(condition, dict):
+                for operator, value in condition.items():
+                    mask &= self.compare(key, operator, value)
+            elif isinstance(condition, (list, tuple, set)):
+                mask &= self.compare(key, "$in", condition)
+            else:
+                mask &= self.compare(key, "$eq", condition)
+
+        return mask
+
+    def compare(self, key: str, operator: str, value: Any) -> np.ndarray:
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown filter operator: {operator}")
+
+        if key in self.values:
+            return self._compare_values(self.values[key], operator, value)
+
+        if key in self.codes:
+            return self._compare_codes(key, operator, value)
+
+        # missing key, as metadata.get(key) is None
+        return np.full(self.num_rows, operator in ("$neq", "$nin"), dtype=bool)
+
+    def _compare_values(
+        self, column: np.ndarray, operator: str, value: Any
+    ) -> np.ndarray:
+        if operator in ("$in", "$nin"):
+            numbers = [self._to_number(item) for item in value]
+            mask = np.isin(column, numbers)
+            return mask if operator == "$in" else ~mask
+
+        number = self._to_number(value)
+        match operator:
+            case "$eq":
+                return column == number
+            case "$neq":
+                return column != number
+            case "$gt":
+                return column > number
+            case "$gte":
+                return column >= number
+            case "$lt":
+                return column < number
+            case _:
+                return column <= number
+
+    def _compare_codes(self, key: str, operator: str, value: Any) -> np.ndarray:
+        codes, categories = self.codes[key], self.categories[key]
+
+        if operator in ("$in", "$nin"):
+            positions = [self._get_code(categories, item) for item in value]
+            mask = np.isin(codes, [position for position in positions if position >= 0])
+            return mask if operator == "$in" else ~mask
+
+        match operator:
+            case "$eq" | "$neq":
+                code = self._get_code(categories, value)
+                mask = codes == code if code >= 0 else np.zeros(len(codes), dtype=bool)
+                return mask if operator == "$eq" else ~mask
+            case "$gt":
+                return codes >= np.searchsorted(categories, str(value), side="right")
+            case "$gte":
+                return codes >= np.searchsorted(categories, str(value), side="left")
+            case "$lt":
+                return (codes >= 0) & (
+                    codes < np.searchsorted(categories, str(value), side="left")
+                )
+            case _:
+                return (codes >= 0) & (
+                    codes < np.searchsorted(categories, str(value), side="right")
+                )
+
+    @staticmethod
+    def _get_code(categories: List[str], value: Any) -> int:
+        position = int(np.searchsorted(categories, str(value)))
+        if position < len(categories) and categories[position] == str(value):
+            return position
+        return -1
+
+    @staticmethod
+    def _to_number(value: Any) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0.0, 1.0, norms)
+
+
+def maximal_marginal_relevance(
+    query_vectors: np.ndarray,
+    candidate_vectors: np.ndarray,
+    valid: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> np.ndarray:
+    num_queries, num_candidates = valid.shape
+    selection = np.full((num_queries, max(k, 0)), -1, dtype=np.int64)
+    if k <= 0 or not num_candidates:
+        return selection
+
+    # cosine similarities, candidate x candidate with a single batched matmul
+    queries = normalize(query_vectors)
+    candidates = normalize(candidate_vectors)
+    query_similarities = np.einsum("qd,qcd->qc", queries, candidates)
+    candidate_similarities = np.matmul(candidates, candidates.transpose(0, 2, 1))
+
+    available = valid.copy()
+    redundancies = np.full((num_queries, num_candidates), -np.inf)
+    num_selected = np.minimum(k, valid.sum(axis=1))
+    queries_range = np.arange(num_queries)
+
+    # greedy selection for all queries at once, first maximum wins as in LangChain
+    for step in range(min(k, num_candidates)):
+        if step == 0:
+            scores = query_similarities.copy()
+        else:
+            scores = lambda_mult * query_similarities - (1 - lambda_mult) * redundancies
+        scores[~available] = -np.inf
+
+        best = np.argmax(scores, axis=1)
+        active = step < num_selected
+        selection[active, step] = best[active]
+        available[queries_range[active], best[active]] = False
+        redundancies = np.maximum(
+            redundancies, candidate_similarities[queries_range, best]
+        )
+
+    return selection
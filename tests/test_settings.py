@@ -0,0 +1,45 @@
+from rag_3w_cot.settings import RUNTIME_FIELDS, STAGE_FIELDS, Settings
+
+DECLARED_FIELDS = [field for fields in STAGE_FIELDS.values() for field in fields]
+
+
+def test_settings_fields_are_declared():
+    # a new setting must be declared, otherwise it would silently not bust caches
+    undeclared_fields = set(Settings.model_fields) - set(
+        DECLARED_FIELDS + RUNTIME_FIELDS
+    )
+    assert not undeclared_fields
+
+
+def test_declared_fields_exist():
+    unknown_fields = set(DECLARED_FIELDS + RUNTIME_FIELDS) - set(Settings.model_fields)
+    assert not unknown_fields
+
+
+def test_runtime_fields_do_not_change_stage_hashes():
+    assert not set(RUNTIME_FIELDS) & set(DECLARED_FIELDS)
+
+    settings = Settings(OPENAI_API_KEY="", HF_TOKEN="")  # pyright: ignore
+    other_settings = settings.model_copy(
+        update={
+            "processing_max_concurrent_tasks": 16,
+            "embeddings_huggingface_batch_size": 64,
+            "embeddings_huggingface_token_budget": None,
+        }
+    )
+    assert settings.get_stage_hashes() == other_settings.get_stage_hashes()
+
+
+def test_stage_fields_change_downstream_hashes():
+    settings = Settings(OPENAI_API_KEY="", HF_TOKEN="")  # pyright: ignore
+    other_settings = settings.model_copy(
+        update={"processing_query_similarity_document_text_top_k": 1}
+    )
+
+    hashes = settings.get_stage_hashes()
+    other_hashes = other_settings.get_stage_hashes()
+    assert [stage for stage in hashes if hashes[stage] != other_hashes[stage]] == [
+        "retrieve",
+        "generate",
+        "evaluate",
+    ]